@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+
+# Shortest gap between prediction requests for a station, the poller's own cycle
+MIN_POLL_INTERVAL = timedelta(seconds=60)
+
+# Longest a station goes without fresh predictions
+MAX_POLL_INTERVAL = timedelta(minutes=15)
+
+# Longest parking buffer the signs add before picking the departures they show
+SIGN_BUFFER = timedelta(minutes=15)
+
+def sign_window(scheduled_departure_times):
+    # How far ahead the signs look: the buffer plus the two departures they show, a headway each.
+    # None while fewer than two departures remain, since every one left is on the signs
+    if len(scheduled_departure_times) < 2:
+        return None
+    headway = max(later - earlier for earlier, later in zip(scheduled_departure_times, scheduled_departure_times[1:]))
+    return SIGN_BUFFER + 2 * headway
+
+# Decides each cycle which stations need fresh predictions, and keeps the last ones for the others
+class AdaptivePollScheduler:
+    def __init__(self, min_interval=MIN_POLL_INTERVAL, max_interval=MAX_POLL_INTERVAL):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.stations = {}
+
+    def due(self, key, now):
+        entry = self.stations.get(key)
+        return entry is None or now >= entry['next_poll']
+
+    def cached_predictions(self, key, now):
+        # The last predictions for the station, without trips that have departed since
+        return [prediction for prediction in self.stations[key]['predictions']
+                if prediction[2] is not None and datetime.fromisoformat(prediction[2]) >= now]
+
+    def record(self, key, now, predictions, next_departure, departure_window):
+        # Store fresh (trip ID, arrival time, departure time) predictions and schedule the station's next poll.
+        # Only the trips and their departures count as a change
+        departures = [(trip_id, departure_time) for trip_id, _, departure_time in predictions]
+        entry = self.stations.get(key)
+        if entry is None or entry['departures'] != departures:
+            last_change = now
+        else:
+            last_change = entry['last_change']
+
+        self.stations[key] = {
+            'predictions': predictions,
+            'departures': departures,
+            'last_change': last_change,
+            'next_poll': now + self.interval(now, last_change, next_departure, departure_window),
+        }
+
+    def interval(self, now, last_change, next_departure, departure_window):
+        # Poll every cycle while predictions are moving or a departure is within sight of the signs
+        if last_change == now:
+            return self.min_interval
+        if next_departure is not None and (departure_window is None or next_departure - now <= departure_window):
+            return self.min_interval
+
+        # Otherwise back off as long as predictions have held, but wake up before the next departure comes into sight
+        interval = min(now - last_change, self.max_interval)
+        if next_departure is not None:
+            interval = min(interval, next_departure - now - departure_window)
+        return max(interval, self.min_interval)
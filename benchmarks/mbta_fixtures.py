@@ -0,0 +1,187 @@
+import argparse
+import gzip
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse, parse_qs
+
+import requests
+import requests.adapters
+
+# Stops the pollers query, departure stops first, then the arrival stops
+RECORD_STOPS = ['place-ER-0362', 'place-ER-0183', 'place-wondl', 'place-bmmnl', 'BNT-0000', 'place-state']
+
+RECORD_ENDPOINTS = {
+    'predictions': 'https://api-v3.mbta.com/predictions',
+    'schedules': 'https://api-v3.mbta.com/schedules',
+}
+
+TIME_ATTRIBUTES = ['arrival_time', 'departure_time']
+
+# Fixtures hold every record the API returned for each stop, keyed by endpoint and then by the stop filter
+def record_fixtures(api_key, stops=RECORD_STOPS):
+    fixtures = {'recorded_at': datetime.now(timezone(timedelta(hours=-4))).isoformat()}
+    for endpoint, url in RECORD_ENDPOINTS.items():
+        fixtures[endpoint] = {}
+        for stop_id in stops:
+            response = requests.get(f"{url}?filter[stop]={stop_id}&api_key={api_key}")
+            response.raise_for_status()
+            fixtures[endpoint][stop_id] = response.json()['data']
+    return fixtures
+
+def make_record(kind, trip_id, stop_id, route_id, direction_id, arrival_time, departure_time):
+    return {
+        'type': kind,
+        'id': f"{kind}-{trip_id}-{stop_id}",
+        'attributes': {
+            'arrival_time': arrival_time.isoformat() if arrival_time else None,
+            'departure_time': departure_time.isoformat() if departure_time else None,
+            'direction_id': direction_id,
+        },
+        'relationships': {
+            'route': {'data': {'id': route_id, 'type': 'route'}},
+            'stop': {'data': {'id': stop_id, 'type': 'stop'}},
+            'trip': {'data': {'id': trip_id, 'type': 'trip'}},
+        },
+    }
+
+# Build a service day of fixtures in the recorded layout, with realtime predictions for the next hour
+def synthetic_fixtures(recorded_at=None, seed=0):
+    rnd = random.Random(seed)
+    recorded_at = recorded_at or datetime.now(timezone(timedelta(hours=-4))).replace(microsecond=0)
+    service_start = recorded_at.replace(hour=5, minute=0, second=0)
+    fixtures = {'recorded_at': recorded_at.isoformat(), 'predictions': {}, 'schedules': {}}
+
+    lines = [
+        # (route, direction, headway minutes, [(departure stop, minutes from origin)], arrival stop, run time)
+        ('CR-Newburyport', 1, 60, [('place-ER-0362', 0), ('place-ER-0183', 25)], 'BNT-0000', 65),
+        ('Blue', 0, 6, [('place-wondl', 0), ('place-bmmnl', 2)], 'place-state', 14),
+    ]
+    for route_id, direction_id, headway, departures, arrival_stop, run_time in lines:
+        for direction in (direction_id, 1 - direction_id):
+            for index, offset in enumerate(range(0, 20 * 60, headway)):
+                trip_id = f"{route_id}-{direction}-{index}"
+                origin_time = service_start + timedelta(minutes=offset)
+                delay = timedelta(minutes=rnd.choice([0, 0, 1, 2, 5]))
+                predicted = direction == direction_id and timedelta(0) <= origin_time - recorded_at <= timedelta(hours=1)
+
+                for stop_id, minutes in departures:
+                    departure_time = origin_time + timedelta(minutes=minutes)
+                    fixtures['schedules'].setdefault(stop_id, []).append(
+                        make_record('schedule', trip_id, stop_id, route_id, direction, departure_time, departure_time))
+                    if predicted:
+                        fixtures['predictions'].setdefault(stop_id, []).append(
+                            make_record('prediction', trip_id, stop_id, route_id, direction, departure_time + delay, departure_time + delay))
+
+                arrival_time = origin_time + timedelta(minutes=run_time)
+                fixtures['schedules'].setdefault(arrival_stop, []).append(
+                    make_record('schedule', trip_id, arrival_stop, route_id, direction, arrival_time, None))
+                if predicted and rnd.random() < 0.8:
+                    fixtures['predictions'].setdefault(arrival_stop, []).append(
+                        make_record('prediction', trip_id, arrival_stop, route_id, direction, arrival_time + delay, None))
+
+    return fixtures
+
+def load_fixtures(path):
+    with open(path) as f:
+        return json.load(f)
+
+# Move every time in the fixtures by the same amount so a recording replays as if it were taken at now
+def shift_fixtures(fixtures, now=None):
+    now = now or datetime.now(timezone(timedelta(hours=-4)))
+    delta = now - datetime.fromisoformat(fixtures['recorded_at'])
+    shifted = {'recorded_at': now.isoformat()}
+    for endpoint in RECORD_ENDPOINTS:
+        shifted[endpoint] = {}
+        for stop_id, records in fixtures[endpoint].items():
+            shifted[endpoint][stop_id] = []
+            for record in records:
+                attributes = dict(record['attributes'])
+                for name in TIME_ATTRIBUTES:
+                    if attributes.get(name):
+                        attributes[name] = (datetime.fromisoformat(attributes[name]) + delta).isoformat()
+                shifted[endpoint][stop_id].append({**record, 'attributes': attributes})
+    return shifted
+
+# Answer a query with the filter semantics the pollers rely on
+def query_fixtures(fixtures, endpoint, params):
+    def values(name):
+        return params[name].split(',') if params.get(name) else None
+
+    stops = values('filter[stop]') or list(fixtures[endpoint])
+    trips = values('filter[trip]')
+    routes = values('filter[route]')
+    direction_id = params.get('filter[direction_id]')
+
+    data = []
+    for stop_id in stops:
+        for record in fixtures[endpoint].get(stop_id, []):
+            relationships = record['relationships']
+            if trips is not None and relationships['trip']['data']['id'] not in trips:
+                continue
+            if routes is not None and relationships['route']['data']['id'] not in routes:
+                continue
+            if direction_id is not None and str(record['attributes'].get('direction_id')) != direction_id:
+                continue
+            data.append(record)
+
+    # Sparse fieldsets keep only the listed attributes of that record type
+    fields = {kind[7:-1]: params[kind].split(',') for kind in params if kind.startswith('fields[')}
+    data = [
+        {**record, 'attributes': {name: value for name, value in record['attributes'].items() if name in fields[record['type']]}}
+        if record['type'] in fields else record
+        for record in data
+    ]
+    return {'data': data, 'jsonapi': {'version': '1.0'}}
+
+# Serves fixture responses to a requests session without touching the network
+class FixtureAdapter(requests.adapters.BaseAdapter):
+    def __init__(self, fixtures, latency=0):
+        super().__init__()
+        self.fixtures = fixtures
+        self.latency = latency
+        self.requests = 0
+        self.bytes = 0
+
+    def send(self, request, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+
+        url = urlparse(request.url)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        body = json.dumps(query_fixtures(self.fixtures, url.path.rstrip('/').rsplit('/', 1)[-1], params)).encode()
+
+        # Report the size the body would have on the wire, gzipped if the client accepts it
+        size = len(body)
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            size = len(gzip.compress(body))
+
+        response = requests.Response()
+        response.status_code = 200
+        response.headers['Content-Type'] = 'application/vnd.api+json'
+        response.headers['Content-Length'] = str(size)
+        response._content = body
+        response.url = request.url
+        response.request = request
+        self.requests += 1
+        self.bytes += size
+        return response
+
+    def close(self):
+        pass
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Record or generate MBTA v3 API fixtures for the benchmarks.')
+    parser.add_argument('output', help='fixture file to write')
+    parser.add_argument('--record', metavar='API_KEY', help='record live responses with this API key instead of generating them')
+    parser.add_argument('--seed', type=int, default=0, help='seed for generated fixtures')
+    parser.add_argument('--recorded-at', help='ISO timestamp generated fixtures are taken at, now if omitted')
+    args = parser.parse_args()
+
+    fixtures = record_fixtures(args.record) if args.record else synthetic_fixtures(datetime.fromisoformat(args.recorded_at) if args.recorded_at else None, args.seed)
+    with open(args.output, 'w') as f:
+        json.dump(fixtures, f)
+    print(f"Wrote {sum(len(records) for records in fixtures['predictions'].values())} predictions and "
+          f"{sum(len(records) for records in fixtures['schedules'].values())} schedules to {args.output}", file=sys.stderr)
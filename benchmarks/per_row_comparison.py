@@ -0,0 +1,153 @@
+import re
+import pandas as pd
+from datetime import datetime
+
+# The per-row comparison comp_logic_2.0.py ran before process_data was vectorized, two schedules_and_pred
+# queries per log row. Kept as it was, only taking the cursor as an argument, so the benchmarks can show the speedup
+
+def extract_time(message):
+    times = re.findall(r'@ (\d{2}:\d{2} [APM]{2})', message)
+    extracted_times = []
+    
+    for time in times:
+        extracted_time = datetime.strptime(time, '%I:%M %p').strftime('%H:%M')
+        extracted_times.append(extracted_time)
+    
+    return extracted_times
+
+
+# Define a function to process the data
+def process_data(df, cursor):
+    # Filter dataframe for desired locations and logic state
+    filtered_df = df[(df['Location'].isin(['Newburyport', 'Beverly'])) & (df['Logic State'] == 'Normal')]
+
+    # Create an empty DataFrame to store inconsistencies and message errors
+    inconsistencies = pd.DataFrame(columns=['Timestamp', 'Sign ID', 'Buffered Timestamp', 'Location', 'Reported Times', 'Scheduled Times', 'Predicted Times', 'Mismatch Type'])
+    message_errors = pd.DataFrame(columns=['Timestamp', 'Sign ID', 'Buffered Timestamp', 'Location', 'Message', 'Ratio'])
+
+    # Iterate over each row in the DataFrame
+    for index, row in filtered_df.iterrows():
+        timestamp = row['Timestamp']
+        sign_id = row['Sign ID']
+        location = row['Location']
+        message = row['Message']
+        parking_TT = row['Transit Parking TT']
+        ratio = row['Highway/Transit Ratio']
+
+        # Parse the message to obtain reported departure times
+        reported_times = extract_time(message)
+
+        # Check to make sure each relevant field is not null
+        if pd.isnull(timestamp) or pd.isnull(location) or pd.isnull(message) or pd.isnull(parking_TT):
+            inconsistencies = pd.concat(
+                [inconsistencies, pd.DataFrame(
+                    {'Timestamp': [timestamp], 'Sign ID': [sign_id], 'Buffered Timestamp': None, 'Location': [location], 'Reported Times': [reported_times],
+                    'Scheduled Times': None, 'Predicted Times': None, 'Mismatch Type': 'Missing Field'})],
+                ignore_index=True
+            )
+            continue
+
+        # Calculate the rounded down timestamp and add the buffer time
+        buffered_timestamp = pd.to_datetime(timestamp) + pd.Timedelta(minutes=parking_TT)
+
+        # Check to make sure the message is correct
+        if (ratio >= 1.2 and 'FASTER ROUTE' not in message) or ('FASTER ROUTE' in message and ratio < 1.2):
+            message_errors = pd.concat(
+                [message_errors, pd.DataFrame(
+                    {'Timestamp': [timestamp], 'Sign ID': [sign_id], 'Buffered Timestamp': [buffered_timestamp], 'Location': [location], 'Message': [message],
+                    'Ratio': [ratio]})],
+                ignore_index=True
+            )
+
+        # Query the PostgreSQL database for matching schedule records at the same timestamp (up to the minute)
+        query = """
+            SELECT depart_station, scheduled_depart_time
+            FROM schedules_and_pred 
+            WHERE date_trunc('minute', timestamp) = date_trunc('minute', %s)
+            AND depart_station = %s
+            AND scheduled_depart_time >= %s
+            ORDER BY scheduled_depart_time;
+        """
+        buffer_time = pd.to_datetime(timestamp) + pd.Timedelta(minutes=parking_TT)
+        cursor.execute(query, (timestamp, location, buffer_time))
+        queried_records = cursor.fetchall()
+
+        scheduled_times = []
+
+        # Check if there are three or more schedule records available
+        if len(queried_records) >= 3:
+            # Remove duplicate schedule times
+            queried_records = list(set(queried_records))
+
+            # Sort the queried records by departure time in ascending order
+            queried_records.sort(key=lambda x: x[1])
+
+            # Select the two closest records to the buffer time
+            selected_records = queried_records[:2]
+
+            # Extract actual departure times from the selected records
+            scheduled_times = [record[1].strftime('%H:%M') if record[1] else None for record in selected_records]
+        else:
+            scheduled_times = [record[1].strftime('%H:%M') if record[1] else None for record in queried_records]
+        
+        # Query the PostgreSQL database for matching records at the same timestamp (up to the minute)
+        query = """
+            SELECT depart_station, predicted_depart_time 
+            FROM schedules_and_pred 
+            WHERE date_trunc('minute', timestamp) = date_trunc('minute', %s)
+            AND depart_station = %s
+            AND predicted_depart_time >= %s
+            ORDER BY predicted_depart_time;
+        """
+        cursor.execute(query, (timestamp, location, buffer_time))
+        queried_records = cursor.fetchall()
+
+        # Extract actual predicted departure times from the queried records
+        predicted_times = [record[1].strftime('%H:%M') if record[1] else None for record in queried_records]
+
+        # Check if any results were returned by the query
+        if scheduled_times:
+            unmatched_reported_times = reported_times.copy()
+
+            # Check for match between predicted and reported times
+            matched_predicted_times = set()
+            for predicted_time in predicted_times:
+                if predicted_time in unmatched_reported_times:
+                    unmatched_reported_times.remove(predicted_time)
+                    matched_predicted_times.add(predicted_time)
+
+            # Check for match between scheduled and unmatched reported times
+            matched_scheduled_times = set()
+            for scheduled_time in scheduled_times:
+                if scheduled_time in unmatched_reported_times:
+                    unmatched_reported_times.remove(scheduled_time)
+                    matched_scheduled_times.add(scheduled_time)
+
+            # Determine mismatch type based on unmatched reported times
+            if any(predicted_times) and not matched_predicted_times and matched_scheduled_times and not unmatched_reported_times:
+                mismatch_type = 'Predictions'
+            elif not matched_predicted_times and not matched_scheduled_times:
+                mismatch_type = 'Complete'
+            elif unmatched_reported_times:
+                mismatch_type = 'Partial'
+            else:
+                continue  # Skip row if all reported times are matched
+
+            # Store the details in the inconsistencies DataFrame
+            inconsistencies = pd.concat(
+                [inconsistencies, pd.DataFrame(
+                    {'Timestamp': [timestamp], 'Sign ID': [sign_id], 'Buffered Timestamp': [buffered_timestamp], 'Location': [location], 'Reported Times': [reported_times],
+                     'Scheduled Times': [scheduled_times], 'Predicted Times': [predicted_times], 'Mismatch Type': [mismatch_type]})],
+                ignore_index=True
+            )
+        else:
+            # No data available in the database for the given timestamp and location
+            mismatch_type = 'No Data'
+            inconsistencies = pd.concat(
+                [inconsistencies, pd.DataFrame(
+                    {'Timestamp': [timestamp], 'Sign ID': [sign_id], 'Buffered Timestamp': [buffered_timestamp], 'Location': [location], 'Reported Times': [reported_times],
+                     'Scheduled Times': None, 'Predicted Times': None, 'Mismatch Type': [mismatch_type]})],
+                ignore_index=True
+            )
+
+    return inconsistencies, message_errors
@@ -0,0 +1,189 @@
+import argparse
+import gzip
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from mbta_fixtures import RECORD_ENDPOINTS, TIME_ATTRIBUTES, load_fixtures, query_fixtures, shift_fixtures, synthetic_fixtures
+
+# Seconds between keep-alive comments on an event stream with nothing to send
+KEEPALIVE_INTERVAL = 15
+
+# Shift one prediction's times by up to a minute, as a live update would
+def nudge_prediction(record):
+    shift = timedelta(seconds=random.choice([-60, -30, 30, 60]))
+    attributes = dict(record['attributes'])
+    for name in TIME_ATTRIBUTES:
+        if attributes.get(name):
+            attributes[name] = (datetime.fromisoformat(attributes[name]) + shift).isoformat()
+    return {**record, 'attributes': attributes}
+
+# Tracks the requests left in the current rate-limit window, like the API's per-key limit
+class RateLimiter:
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.lock = threading.Lock()
+        self.reset_at = time.time() + window
+        self.remaining = limit
+
+    def take(self):
+        with self.lock:
+            now = time.time()
+            if now >= self.reset_at:
+                self.reset_at = now + self.window
+                self.remaining = self.limit
+            allowed = self.remaining > 0
+            if allowed:
+                self.remaining -= 1
+            return allowed, self.remaining, int(self.reset_at)
+
+# Serves /predictions and /schedules from fixtures with the API's filter semantics
+class ReplayHandler(BaseHTTPRequestHandler):
+    fixtures = None
+    latency = 0
+    jitter = 0
+    error_rate = 0
+    rate_limiter = None
+    stream_interval = 0
+    stream_duration = None
+    quiet = True
+
+    def do_GET(self):
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+
+        headers = {}
+        if self.rate_limiter is not None:
+            allowed, remaining, reset_at = self.rate_limiter.take()
+            headers = {'x-ratelimit-limit': str(self.rate_limiter.limit), 'x-ratelimit-remaining': str(remaining),
+                       'x-ratelimit-reset': str(reset_at)}
+            if not allowed:
+                return self.reply(429, {'errors': [{'status': '429', 'code': 'rate_limited'}]}, headers)
+
+        if random.random() < self.error_rate:
+            status = random.choice([500, 502, 503])
+            return self.reply(status, {'errors': [{'status': str(status), 'code': 'unavailable'}]}, headers)
+
+        url = urlparse(self.path)
+        endpoint = url.path.rstrip('/').rsplit('/', 1)[-1]
+        if endpoint not in RECORD_ENDPOINTS:
+            return self.reply(404, {'errors': [{'status': '404', 'code': 'not_found'}]}, headers)
+
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        if endpoint == 'predictions' and 'text/event-stream' in self.headers.get('Accept', ''):
+            return self.stream(params, headers)
+        body = json.dumps(query_fixtures(self.fixtures, endpoint, params)).encode()
+
+        # Let the schedule cache revalidate with If-None-Match, as it does against the API
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        headers['ETag'] = etag
+        if self.headers.get('If-None-Match') == etag:
+            return self.reply(304, None, headers)
+        self.reply(200, body, headers)
+
+    def stream(self, params, headers):
+        # Stream the matching predictions like the API does: a reset with all of them, then one change at a time
+        records = {record['id']: record for record in query_fixtures(self.fixtures, 'predictions', params)['data']}
+        removed = []
+        self.protocol_version = 'HTTP/1.1'
+        self.close_connection = True
+        self.send_response(200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        try:
+            self.send_event('reset', list(records.values()))
+            closes_at = time.monotonic() + self.stream_duration if self.stream_duration else None
+            while closes_at is None or time.monotonic() < closes_at:
+                wait = self.stream_interval or KEEPALIVE_INTERVAL
+                time.sleep(min(wait, closes_at - time.monotonic()) if closes_at else wait)
+                if not self.stream_interval or not records:
+                    self.send_chunk(b': keep-alive\n\n')
+                elif removed and random.random() < 0.1:
+                    record = removed.pop()
+                    records[record['id']] = record
+                    self.send_event('add', record)
+                elif random.random() < 0.1:
+                    record = records.pop(random.choice(list(records)))
+                    removed.append(record)
+                    self.send_event('remove', {'id': record['id'], 'type': record['type']})
+                else:
+                    record_id = random.choice(list(records))
+                    records[record_id] = nudge_prediction(records[record_id])
+                    self.send_event('update', records[record_id])
+            self.send_chunk(b'')
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def send_event(self, event, data):
+        self.send_chunk(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode())
+
+    def send_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b'\r\n')
+        self.wfile.flush()
+
+    def reply(self, status, body, headers):
+        if isinstance(body, dict):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if body is not None:
+            if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                body = gzip.compress(body)
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Type', 'application/vnd.api+json')
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body is not None:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+def make_server(fixtures, host='127.0.0.1', port=8000, latency=0, jitter=0, error_rate=0, rate_limit=None, rate_window=60,
+                stream_interval=0, stream_duration=None, quiet=True):
+    # Each server gets its own handler class so several can run with different settings
+    handler = type('Handler', (ReplayHandler,), {
+        'fixtures': shift_fixtures(fixtures),
+        'latency': latency,
+        'jitter': jitter,
+        'error_rate': error_rate,
+        'rate_limiter': RateLimiter(rate_limit, rate_window) if rate_limit else None,
+        'stream_interval': stream_interval,
+        'stream_duration': stream_duration,
+        'quiet': quiet,
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve MBTA v3 fixtures locally. Point the pollers at it with MBTA_API_BASE=http://HOST:PORT.')
+    parser.add_argument('--fixtures', help='recorded fixture file, generated fixtures if omitted')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0, help='up to this many extra random seconds per response')
+    parser.add_argument('--error-rate', type=float, default=0, help='fraction of requests answered with a 5xx error')
+    parser.add_argument('--rate-limit', type=int, help='requests allowed per window before answering 429')
+    parser.add_argument('--rate-window', type=float, default=60, help='seconds in a rate-limit window')
+    parser.add_argument('--stream-interval', type=float, default=0, help='seconds between changes on a prediction event stream, none if 0')
+    parser.add_argument('--stream-duration', type=float, help='close every event stream after this many seconds')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else synthetic_fixtures()
+    server = make_server(fixtures, args.host, args.port, args.latency, args.jitter, args.error_rate, args.rate_limit,
+                         args.rate_window, args.stream_interval, args.stream_duration, not args.verbose)
+    print(f"Serving MBTA fixtures on http://{args.host}:{server.server_address[1]}")
+    server.serve_forever()
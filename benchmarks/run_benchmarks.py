@@ -0,0 +1,255 @@
+import argparse
+import asyncio
+import contextlib
+import gzip
+import importlib.util
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+from datetime import datetime
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+sys.path.insert(1, REPO_DIR)
+
+import per_row_comparison
+from mbta_fixtures import RECORD_ENDPOINTS, RECORD_STOPS, FixtureAdapter, load_fixtures, query_fixtures, shift_fixtures, synthetic_fixtures
+from replay_server import make_server
+from synthetic_vms import generate_schedule_rows, generate_vms_log
+
+# Database the benchmarks create and fill, kept apart from the production tables
+BENCHMARK_DATABASE = 'sumner_benchmark'
+
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, 'baseline.json')
+
+# Metrics compared against the baseline, and whether a larger value is better
+METRICS = {
+    'comparison_rows_per_sec': True,
+    'comparison_speedup': True,
+    'comparison_peak_mb': False,
+    'poll_cycle_seconds': False,
+    'poll_peak_mb': False,
+    'poll_bytes_per_cycle': False,
+}
+
+def benchmark_db_config(pgserver_dir=None):
+    # Point at an embedded server if asked, otherwise at the configured server
+    if pgserver_dir:
+        import pgserver
+        # Only started for its socket; with no cleanup mode it keeps running after the benchmarks exit
+        pgserver.get_server(pgserver_dir, cleanup_mode=None)
+        db_config = {'host': pgserver_dir, 'user': 'postgres', 'dbname': 'postgres'}
+    else:
+        from predictions_config import db_config
+        db_config = dict(db_config)
+
+    # Create the benchmark database next to the configured one
+    conn = psycopg2.connect(**db_config)
+    conn.autocommit = True
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s", (BENCHMARK_DATABASE,))
+    if cursor.fetchone() is None:
+        cursor.execute(f"CREATE DATABASE {BENCHMARK_DATABASE}")
+    conn.close()
+
+    return {**db_config, 'dbname': BENCHMARK_DATABASE}
+
+def use_db_config(db_config):
+    # The scripts import their settings from predictions_config, so hand them the benchmark database
+    config = types.ModuleType('predictions_config')
+    config.db_config = db_config
+    config.API_KEY = 'benchmark'
+    sys.modules['predictions_config'] = config
+
+def load_script(file_name, module_name):
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(REPO_DIR, file_name))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def load_schedules(db_config, rows):
+    from schedules_schema import create_database_table
+
+    create_database_table()
+    conn = psycopg2.connect(**db_config)
+    cursor = conn.cursor()
+    cursor.execute('TRUNCATE schedules_and_pred')
+    execute_values(cursor, """
+        INSERT INTO schedules_and_pred (timestamp, trip_id, depart_station, scheduled_depart_time, predicted_depart_time, arrive_station, arrive_time, transit_time)
+        VALUES %s
+    """, rows, page_size=10000)
+    conn.commit()
+    conn.close()
+
+def measure(function, repeat):
+    # Best wall-clock time over the repeats, then the peak traced allocation of one more run
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start_time)
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(timings), peak / 2 ** 20
+
+def benchmark_comparison(db_config, rows, repeat, workers, per_row_rows):
+    start = datetime(2023, 8, 1, 6, 0)
+    log_path = os.path.join(tempfile.mkdtemp(), 'vms_log.txt')
+    generate_vms_log(log_path, rows, start)
+
+    # Cover every minute of the log, plus the buffer the signs look ahead
+    minutes = rows // 8 + 30
+    load_schedules(db_config, generate_schedule_rows(start, minutes))
+
+    comp_logic = load_script('comp_logic_2.0.py', 'comp_logic')
+    df = next(comp_logic.read_log_chunks(log_path, chunksize=rows))
+
+    def run():
+        comp_logic.schedule_index = comp_logic.ScheduleIndex()
+        comp_logic.compare(df, workers)
+
+    seconds, peak_mb = measure(run, repeat)
+
+    # Time the per-row comparison it replaced on the first rows of the same log, once since it queries per row
+    conn = psycopg2.connect(**db_config)
+    per_row_df = df.head(per_row_rows)
+    start_time = time.perf_counter()
+    per_row_comparison.process_data(per_row_df, conn.cursor())
+    per_row_seconds = time.perf_counter() - start_time
+    conn.close()
+    per_row_rate = len(per_row_df) / per_row_seconds
+
+    return {'comparison_rows': rows, 'comparison_seconds': seconds, 'comparison_rows_per_sec': rows / seconds,
+            'comparison_peak_mb': peak_mb, 'comparison_per_row_rows': len(per_row_df),
+            'comparison_per_row_rows_per_sec': per_row_rate, 'comparison_speedup': rows / seconds / per_row_rate}
+
+def benchmark_poller(fixtures, cycles, latency, replay=False):
+    if replay:
+        # Go through real HTTP against a local replay server instead of the in-process adapter
+        server = make_server(fixtures, port=0, latency=latency)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        os.environ['MBTA_API_BASE'] = f"http://127.0.0.1:{server.server_address[1]}"
+
+    # Time the shared poller running predictions_4's strategy
+    from poll_strategies import SchedulesAndPredStrategy
+    poller = load_script('poller.py', 'poller')
+    strategy = SchedulesAndPredStrategy()
+    strategy.create_tables()
+
+    adapter = None
+    if not replay:
+        adapter = FixtureAdapter(shift_fixtures(fixtures), latency)
+        poller.client.session.mount(poller.API_BASE, adapter)
+
+    def run():
+        # Silence the per-cycle write report
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(poller.poll_cycle([strategy]))
+
+    timings = []
+    for _ in range(cycles):
+        seconds, peak_mb = measure(run, 1)
+        timings.append(seconds)
+
+    if replay:
+        server.shutdown()
+
+    # Every cycle ran twice, once timed and once traced
+    from poller_metrics import metrics
+    response_bytes = sum(value for (name, _), value in metrics.counters.items() if name == 'api_response_bytes_total')
+    parse = metrics.histograms.get(('json_parse_seconds', ()), {'sum': 0})
+
+    results = {'poll_cycles': cycles, 'poll_cycle_seconds': sum(timings) / len(timings), 'poll_cycle_max_seconds': max(timings),
+               'poll_peak_mb': peak_mb, 'poll_bytes_per_cycle': response_bytes / (2 * cycles),
+               'poll_parse_seconds_per_cycle': parse['sum'] / (2 * cycles)}
+    if adapter is not None:
+        results['poll_requests_per_cycle'] = adapter.requests / (2 * cycles)
+    return results
+
+def benchmark_payloads(fixtures, repeat):
+    # Size and decode time of every stop's full responses against the sparse, gzipped ones the client now asks for
+    from mbta_client import SPARSE_FIELDS, loads, record_times
+
+    full_bodies, sparse_bodies = [], []
+    for endpoint in RECORD_ENDPOINTS:
+        for stop_id in RECORD_STOPS:
+            params = {'filter[stop]': stop_id}
+            full_bodies.append(json.dumps(query_fixtures(fixtures, endpoint, params)).encode())
+            kind, fields = SPARSE_FIELDS[endpoint][1:].split('=')
+            sparse_bodies.append(json.dumps(query_fixtures(fixtures, endpoint, {**params, kind: fields})).encode())
+
+    def parse_full():
+        for body in full_bodies:
+            [{'departure_time': record['attributes']['departure_time'], 'trip_id': record['relationships']['trip']['data']['id']}
+             for record in json.loads(body)['data']]
+
+    def parse_sparse():
+        for body in sparse_bodies:
+            [record_times(record) for record in loads(body)['data']]
+
+    full_seconds, _ = measure(parse_full, repeat)
+    sparse_seconds, _ = measure(parse_sparse, repeat)
+    return {'payload_full_bytes': sum(map(len, full_bodies)),
+            'payload_sparse_gzip_bytes': sum(len(gzip.compress(body)) for body in sparse_bodies),
+            'payload_full_parse_seconds': full_seconds, 'payload_sparse_parse_seconds': sparse_seconds}
+
+def compare_to_baseline(results, baseline, tolerance):
+    regressions = []
+    for metric, higher_is_better in METRICS.items():
+        if metric not in results or metric not in baseline:
+            continue
+        change = (results[metric] - baseline[metric]) / baseline[metric]
+        if (change < -tolerance) if higher_is_better else (change > tolerance):
+            regressions.append(f"{metric}: {baseline[metric]:.4g} -> {results[metric]:.4g} ({change:+.1%})")
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the comparison and the poller against synthetic data.')
+    parser.add_argument('--rows', type=int, default=50000, help='rows in the synthetic VMS log')
+    parser.add_argument('--repeat', type=int, default=3, help='timed comparison runs, the fastest is reported')
+    parser.add_argument('--per-row-rows', type=int, default=2000, help='log rows timed with the per-row comparison the vectorized one replaced')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes for the comparison')
+    parser.add_argument('--cycles', type=int, default=5, help='poll cycles to time')
+    parser.add_argument('--api-latency', type=float, default=0.05, help='simulated seconds per API call')
+    parser.add_argument('--fixtures', help='recorded fixture file, generated fixtures if omitted')
+    parser.add_argument('--replay', action='store_true', help='serve the fixtures over HTTP with benchmarks/replay_server.py')
+    parser.add_argument('--pgserver', metavar='DIR', help='run against an embedded Postgres (pgserver package) in DIR')
+    parser.add_argument('--save-baseline', action='store_true', help=f'store the results as the new baseline in {BASELINE_PATH}')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='relative change that counts as a regression')
+    args = parser.parse_args()
+
+    db_config = benchmark_db_config(args.pgserver)
+    use_db_config(db_config)
+
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else synthetic_fixtures()
+    results = benchmark_comparison(db_config, args.rows, args.repeat, args.workers, args.per_row_rows)
+    results.update(benchmark_poller(fixtures, args.cycles, args.api_latency, args.replay))
+    results.update(benchmark_payloads(fixtures, args.repeat))
+
+    for metric, value in results.items():
+        print(f"{metric}: {value:.4g}")
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {BASELINE_PATH}")
+    elif os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,88 @@
+import argparse
+import random
+from datetime import datetime, timedelta
+
+# (first departure minute after 5 AM, headway minutes, arrival stop, run time minutes) for each station
+STATIONS = {
+    'Newburyport': (0, 60, 'North Station', 65),
+    'Beverly': (25, 60, 'North Station', 40),
+    'Wonderland': (0, 6, 'State', 14),
+    'Beachmont': (2, 6, 'State', 12),
+}
+
+# Signs writing to the log, most of them at the stations the comparison covers
+SIGNS = [('VMS-01', 'Newburyport'), ('VMS-02', 'Newburyport'), ('VMS-03', 'Beverly'), ('VMS-04', 'Beverly'),
+         ('VMS-05', 'Beverly'), ('VMS-06', 'Wonderland'), ('VMS-07', 'Beachmont'), ('VMS-08', 'Newburyport')]
+
+def scheduled_departures(station, moment, count):
+    # Return the next scheduled departures from a station at or after the given moment
+    first, headway, _, _ = STATIONS[station]
+    service_start = moment.replace(hour=5, minute=0, second=0, microsecond=0) + timedelta(minutes=first)
+    elapsed = max((moment - service_start).total_seconds() / 60, 0)
+    index = int(-(-elapsed // headway))
+    return [service_start + timedelta(minutes=headway * (index + i)) for i in range(count)]
+
+def delay(station, departure):
+    # Deterministic per-departure delay so the log and the table agree on what was predicted
+    return timedelta(minutes=random.Random(f"{station}{departure}").choice([0, 0, 1, 2, 5]))
+
+# Rows for schedules_and_pred as the poller would write them, three trips per station per minute
+def generate_schedule_rows(start, minutes, seed=0):
+    rnd = random.Random(seed)
+    rows = []
+    for minute in range(minutes):
+        timestamp = start + timedelta(minutes=minute, seconds=rnd.randint(0, 59))
+        for station, (_, _, arrival_stop, run_time) in STATIONS.items():
+            for departure in scheduled_departures(station, timestamp, 3):
+                predicted = departure + delay(station, departure) if departure - timestamp < timedelta(hours=1) else None
+                arrival_time = (predicted or departure) + timedelta(minutes=run_time)
+                rows.append((timestamp, f"{station}-{departure:%H%M}", station, departure, predicted, arrival_stop,
+                             arrival_time, arrival_time - (predicted or departure)))
+    return rows
+
+def format_time(moment):
+    return moment.strftime('%I:%M %p')
+
+# Write a semicolon-separated VMS log in the 12-column layout select_file reads
+def generate_vms_log(path, rows, start, seed=0):
+    rnd = random.Random(seed)
+    with open(path, 'w') as f:
+        for row in range(rows):
+            sign_id, location = SIGNS[row % len(SIGNS)]
+            timestamp = start + timedelta(minutes=row // len(SIGNS), seconds=rnd.randint(0, 59))
+            parking_tt = rnd.choice([5, 8, 10])
+            buffered = timestamp + timedelta(minutes=parking_tt)
+
+            # Mostly show predictions, sometimes schedules or a stale time, as real signs do
+            departures = []
+            for departure in scheduled_departures(location, buffered, 2):
+                choice = rnd.random()
+                if choice < 0.7:
+                    departures.append(departure + delay(location, departure))
+                elif choice < 0.9:
+                    departures.append(departure)
+                else:
+                    departures.append(departure + timedelta(minutes=rnd.randint(3, 9)))
+
+            highway_tt = rnd.randint(15, 60)
+            transit_tt = rnd.randint(20, 45)
+            ratio = round(highway_tt / transit_tt, 2)
+            faster_route = ratio >= 1.2 if rnd.random() < 0.95 else ratio < 1.2
+            message = 'TRAIN TO BOSTON' + ''.join(f"[nl]@ {format_time(departure)}" for departure in departures)
+            if faster_route:
+                message += '[np]MBTA FASTER ROUTE'
+
+            logic_state = 'Normal' if rnd.random() < 0.97 else 'Blank'
+            fields = [timestamp.strftime('%Y-%m-%d %H:%M:%S'), sign_id, location, logic_state, message, '',
+                      parking_tt, highway_tt, format_time(departures[0]), '', transit_tt, ratio]
+            f.write(';'.join(str(field) for field in fields) + ';\n')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic VMS log in the layout comp_logic_2.0.py reads.')
+    parser.add_argument('output', help='log file to write')
+    parser.add_argument('--rows', type=int, default=100000, help='number of log rows')
+    parser.add_argument('--start', default='2023-08-01 06:00', help='timestamp of the first row')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    generate_vms_log(args.output, args.rows, datetime.fromisoformat(args.start), args.seed)
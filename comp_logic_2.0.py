@@ -1,206 +1,1119 @@
 import psycopg2
+from psycopg2.extras import execute_values
 import pandas as pd
+import numpy as np
 import re
 import os
-import tkinter as tk
-from tkinter import filedialog
+import argparse
+import glob
+import hashlib
+import json
+import shutil
+import io
+import time
 from predictions_config import db_config
-from datetime import datetime
+from datetime import datetime, timedelta
+from collections import OrderedDict, Counter
+from concurrent.futures import ProcessPoolExecutor
 # Connect to PostgreSQL database
 conn = psycopg2.connect(**db_config)
 cursor = conn.cursor()
 
+# Precompiled patterns for the sign markup and the departure times a message reports
+MESSAGE_BREAK_PATTERN = re.compile(r'\[nl\]|\[np\]')
+REPORTED_TIME_PATTERN = re.compile(r'@ (\d{2}):(\d{2}) ([AP]M)')
+
 # Define a function to parse messages and remove excess text
-def parse_message(field):
-    subfields = re.split(r'\[nl\]|\[np\]', field)
-    return ' '.join(subfields)
+def parse_messages(messages):
+    return messages.str.replace(MESSAGE_BREAK_PATTERN, ' ', regex=True)
+
+# Define a function to flag the messages announcing the MBTA as the faster route
+def faster_route_flags(messages):
+    return messages.fillna('').astype(str).str.contains('FASTER ROUTE', regex=False)
+
+# Define a function to extract every reported departure as minutes past midnight, one row per time
+def extract_reported_minutes(messages):
+    matches = messages.fillna('').astype(str).str.extractall(REPORTED_TIME_PATTERN)
+    hours = matches[0].astype(int)
+    minutes = matches[1].astype(int)
+    minute_of_day = (hours % 12 + 12 * (matches[2] == 'PM')) * 60 + minutes
+
+    # Ignore times that are not valid 12-hour clock readings
+    minute_of_day = minute_of_day[(hours >= 1) & (hours <= 12) & (minutes < 60)]
+    return pd.DataFrame({'Row': minute_of_day.index.get_level_values(0), 'Time': minute_of_day.to_numpy(dtype=np.int64)})
+
+# Define a function to format minutes past midnight as HH:MM
+def format_minutes(minutes):
+    return (minutes // 60).astype(str).str.zfill(2) + ':' + (minutes % 60).astype(str).str.zfill(2)
+
+
+# Memory the minute-bucket index may hold before evicting the least recently used service days
+INDEX_MEMORY_CAP = 256 * 1024 * 1024
+
+# Define a function to sort values into per-bucket segments addressed by an offsets array
+def build_segments(codes, values, bucket_count):
+    present = values.notna().to_numpy()
+    codes = codes[present]
+    values = values[present].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    order = np.lexsort((values, codes))
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=bucket_count))])
+    return values[order], offsets
+
+# Define a function to find, for every query, the first segment value at or after its target
+def search_segments(values, offsets, codes, targets):
+    # Sort values and queries together, queries ahead of equal values, so the number of
+    # values preceding a query is the position of its first value >= target
+    segment_codes = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    all_codes = np.concatenate([segment_codes, codes])
+    all_values = np.concatenate([values, targets])
+    is_value = np.concatenate([np.ones(len(values), dtype=np.int64), np.zeros(len(codes), dtype=np.int64)])
+    order = np.lexsort((is_value, all_values, all_codes))
+    preceding_values = np.cumsum(is_value[order]) - is_value[order]
+
+    starts = np.empty(len(codes), dtype=np.int64)
+    starts[order[is_value[order] == 0] - len(values)] = preceding_values[is_value[order] == 0]
+    return starts, offsets[codes + 1]
+
+# Where the poller stored its snapshots: 'snapshots' for schedules_and_pred, 'intervals' for the delta tables
+SCHEDULE_SOURCE = 'snapshots'
+
+# Define a function to rebuild one day of per-minute snapshot records from the delta storage's validity intervals
+def load_interval_records(day, locations=None):
+    start = datetime.combine(day, datetime.min.time())
+    end = start + timedelta(days=1)
+
+    cursor.execute("SELECT cycle_time FROM schedules_and_pred_cycles WHERE cycle_time >= %s AND cycle_time < %s ORDER BY cycle_time", (start, end))
+    cycles = pd.to_datetime(pd.Series([row[0] for row in cursor.fetchall()], dtype=object)).to_numpy(dtype='datetime64[ns]')
+
+    query = """
+        SELECT valid_from, valid_to, depart_station, scheduled_depart_time, predicted_depart_time
+        FROM schedules_and_pred_intervals
+        WHERE valid_from < %s
+        AND (valid_to IS NULL OR valid_to > %s)
+    """
+    params = (end, start)
+    if locations is not None:
+        query += "AND depart_station = ANY(%s)"
+        params += (list(locations),)
+    cursor.execute(query, params)
+    intervals = pd.DataFrame(cursor.fetchall(), columns=['From', 'To', 'Location', 'Scheduled', 'Predicted'])
+
+    # Each interval covers the cycles from its start up to, not including, the cycle that closed it
+    valid_from = pd.to_datetime(intervals['From']).to_numpy(dtype='datetime64[ns]')
+    valid_to = pd.to_datetime(intervals['To'].fillna(end)).to_numpy(dtype='datetime64[ns]')
+    first = np.searchsorted(cycles, valid_from, side='left')
+    lengths = np.searchsorted(cycles, valid_to, side='left') - first
+    positions = np.repeat(first - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+    records = intervals.loc[np.repeat(intervals.index.to_numpy(), lengths), ['Location', 'Scheduled', 'Predicted']].reset_index(drop=True)
+    records.insert(0, 'Minute', pd.Series(cycles[positions]).dt.floor('min'))
+    return records
+
+# Define a class holding schedules_and_pred in memory, keyed by (minute, depart_station) per service day
+class ScheduleIndex:
+    def __init__(self, memory_cap=INDEX_MEMORY_CAP, locations=None, source=None):
+        self.memory_cap = memory_cap
+        self.locations = locations
+        self.source = source or SCHEDULE_SOURCE
+        self.days = OrderedDict()
+        self.nbytes = 0
+
+    # Read the records of one calendar day from the configured source
+    def read_records(self, day):
+        if self.source == 'intervals':
+            return load_interval_records(day, self.locations)
+
+        # The timestamp range prunes to the day's partition and the minute_bucket range uses the composite indexes
+        query = """
+            SELECT minute_bucket, depart_station, scheduled_depart_time, predicted_depart_time
+            FROM schedules_and_pred
+            WHERE timestamp >= %s
+            AND timestamp < %s
+            AND minute_bucket >= %s
+            AND minute_bucket < %s
+        """
+        start = datetime.combine(day, datetime.min.time())
+        params = (start, start + timedelta(days=1)) * 2
+
+        # Restrict the read to the index's stations when it only serves some of them
+        if self.locations is not None:
+            query += "AND depart_station = ANY(%s)"
+            params += (list(self.locations),)
+        cursor.execute(query, params)
+        return pd.DataFrame(cursor.fetchall(), columns=['Minute', 'Location', 'Scheduled', 'Predicted'])
+
+    # Read one calendar day of schedules_and_pred into sorted scheduled and predicted segments
+    def load_day(self, day):
+        return self.build_entry(self.read_records(day))
 
-def extract_time(message):
-    times = re.findall(r'@ (\d{2}:\d{2} [APM]{2})', message)
-    extracted_times = []
-    
-    for time in times:
-        extracted_time = datetime.strptime(time, '%I:%M %p').strftime('%H:%M')
-        extracted_times.append(extracted_time)
-    
-    return extracted_times
+    # Group (minute, location, scheduled, predicted) records into sorted scheduled and predicted segments
+    def build_entry(self, records):
+        records['Minute'] = pd.to_datetime(records['Minute']).astype('datetime64[ns]')
+
+        buckets = pd.MultiIndex.from_frame(records[['Minute', 'Location']].drop_duplicates())
+        codes = buckets.get_indexer(pd.MultiIndex.from_frame(records[['Minute', 'Location']]))
+        scheduled = build_segments(codes, pd.to_datetime(records['Scheduled']), len(buckets))
+        predicted = build_segments(codes, pd.to_datetime(records['Predicted']), len(buckets))
+
+        nbytes = buckets.memory_usage(deep=True) + sum(array.nbytes for array in scheduled + predicted)
+        return {'buckets': buckets, 'Scheduled': scheduled, 'Predicted': predicted, 'nbytes': nbytes}
+
+    # Return the index for a day, loading it once and evicting older days beyond the memory cap
+    def day(self, day):
+        if day in self.days:
+            self.days.move_to_end(day)
+            return self.days[day]
+
+        entry = self.load_day(day)
+        self.days[day] = entry
+        self.nbytes += entry['nbytes']
+        while self.nbytes > self.memory_cap and len(self.days) > 1:
+            _, evicted = self.days.popitem(last=False)
+            self.nbytes -= evicted['nbytes']
+        return entry
+
+    # Return every scheduled or predicted time at or after each row's buffered timestamp, in order
+    def lookup(self, keys, column):
+        found = []
+        for day, day_keys in keys.groupby(keys['Minute'].dt.date):
+            entry = self.day(day)
+            codes = entry['buckets'].get_indexer(pd.MultiIndex.from_arrays(
+                [day_keys['Minute'].astype('datetime64[ns]'), day_keys['Location']]))
+            day_keys = day_keys[codes >= 0]
+            codes = codes[codes >= 0]
+
+            values, offsets = entry[column]
+            targets = day_keys['Buffered Timestamp'].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+            starts, ends = search_segments(values, offsets, codes, targets)
+
+            # Expand each row's [start, end) range into one record per time
+            lengths = ends - starts
+            positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+            found.append(pd.DataFrame({'Row': np.repeat(day_keys['Row'].to_numpy(), lengths),
+                                       column: values[positions].astype('datetime64[ns]')}))
+
+        if not found:
+            return pd.DataFrame({'Row': pd.Series(dtype=np.int64), column: pd.Series(dtype='datetime64[ns]')})
+        return pd.concat(found, ignore_index=True)
+
+# Shared index so files from the same day reuse the loaded records
+schedule_index = ScheduleIndex()
+
+# Define a function to select the departure times each row would have received from the per-row queries
+def lookup_departure_times(keys, index):
+    # Scheduled records at or after the buffer time, two closest (deduplicated) if three or more exist
+    scheduled = index.lookup(keys, 'Scheduled')
+    counts = scheduled.groupby('Row')['Scheduled'].transform('size')
+    scheduled = scheduled[(counts < 3) | ~scheduled.duplicated(['Row', 'Scheduled'])]
+    scheduled = scheduled[scheduled.groupby('Row').cumcount() < 2]
+    scheduled = pd.DataFrame({'Row': scheduled['Row'], 'Time': scheduled['Scheduled'].dt.hour * 60 + scheduled['Scheduled'].dt.minute})
+
+    # Every predicted record at or after the buffer time
+    predicted = index.lookup(keys, 'Predicted')
+    predicted = pd.DataFrame({'Row': predicted['Row'], 'Time': predicted['Predicted'].dt.hour * 60 + predicted['Predicted'].dt.minute})
+
+    return scheduled, predicted
+
+# Define a function to classify every row at once from the reported, scheduled and predicted times
+def classify_mismatches(rows, reported, scheduled, predicted):
+    counts = pd.concat(
+        [reported.groupby(['Row', 'Time']).size().rename('Reported'),
+         predicted.groupby(['Row', 'Time']).size().rename('Predicted'),
+         scheduled.groupby(['Row', 'Time']).size().rename('Scheduled')],
+        axis=1
+    ).fillna(0)
+
+    # Reported times are matched against predictions first, then the remainder against schedules
+    matched_predicted = counts[['Reported', 'Predicted']].min(axis=1)
+    remaining = counts['Reported'] - matched_predicted
+    matched_scheduled = pd.concat([remaining, counts['Scheduled']], axis=1).min(axis=1)
+    unmatched = remaining - matched_scheduled
+
+    per_row = pd.DataFrame({
+        'Matched Predicted': matched_predicted > 0,
+        'Matched Scheduled': matched_scheduled > 0,
+        'Unmatched': unmatched > 0,
+    }).groupby(level='Row').any().reindex(rows, fill_value=False)
+
+    has_scheduled = pd.Series(rows, index=rows).isin(scheduled['Row']).to_numpy()
+    has_predicted = pd.Series(rows, index=rows).isin(predicted['Row']).to_numpy()
+    matched_pred = per_row['Matched Predicted'].to_numpy()
+    matched_sched = per_row['Matched Scheduled'].to_numpy()
+    unmatched_reported = per_row['Unmatched'].to_numpy()
+
+    mismatch_type = np.select(
+        [~has_scheduled,
+         has_predicted & ~matched_pred & matched_sched & ~unmatched_reported,
+         ~matched_pred & ~matched_sched,
+         unmatched_reported],
+        ['No Data', 'Predictions', 'Complete', 'Partial'],
+        default=''
+    )
+    return pd.Series(mismatch_type, index=rows)
+
+# Define a function to collect exploded times back into one list of HH:MM strings per row
+def collect_times(times, rows):
+    formatted = pd.DataFrame({'Row': times['Row'], 'Time': format_minutes(times['Time'])})
+    collected = formatted.groupby('Row')['Time'].agg(list).reindex(rows)
+    return collected.apply(lambda value: value if isinstance(value, list) else [])
+
+# Columns of the inconsistency and message error outputs
+INCONSISTENCY_COLUMNS = ['Timestamp', 'Sign ID', 'Buffered Timestamp', 'Location', 'Reported Times', 'Scheduled Times', 'Predicted Times', 'Mismatch Type']
+MESSAGE_ERROR_COLUMNS = ['Timestamp', 'Sign ID', 'Buffered Timestamp', 'Location', 'Message', 'Ratio']
+
+# Define a function to compare the rows of a filtered log, keeping each result under its row label
+def compare_rows(filtered_df, index):
+
+    # Parse the messages to obtain reported departure times, unless the archive already stores them
+    if 'Reported Minutes' in filtered_df:
+        stored = filtered_df['Reported Minutes'].explode().dropna()
+        reported = pd.DataFrame({'Row': stored.index, 'Time': stored.to_numpy(dtype=np.int64)})
+    else:
+        reported = extract_reported_minutes(filtered_df['Message'])
+    reported_times = collect_times(reported, filtered_df.index)
 
+    # Check to make sure each relevant field is not null
+    missing = (filtered_df['Timestamp'].isna() | filtered_df['Location'].isna() | filtered_df['Message'].isna()
+               | filtered_df['Transit Parking TT'].isna())
+    valid_df = filtered_df[~missing]
+    rows = valid_df.index
+
+    # Calculate the buffered timestamp for every row
+    buffered_timestamps = pd.to_datetime(valid_df['Timestamp']) + pd.to_timedelta(valid_df['Transit Parking TT'], unit='m')
+
+    # Check to make sure the messages are correct
+    faster_route = valid_df['Faster Route'] if 'Faster Route' in valid_df else faster_route_flags(valid_df['Message'])
+    ratio = valid_df['Highway/Transit Ratio']
+    message_error = ((ratio >= 1.2) & ~faster_route) | (faster_route & (ratio < 1.2))
+    message_errors = pd.DataFrame({
+        'Timestamp': valid_df['Timestamp'], 'Sign ID': valid_df['Sign ID'], 'Buffered Timestamp': buffered_timestamps,
+        'Location': valid_df['Location'], 'Message': valid_df['Message'], 'Ratio': ratio
+    })[message_error]
+
+    # Join the log against the schedules_and_pred records at the same timestamp (up to the minute)
+    keys = pd.DataFrame({
+        'Row': rows, 'Minute': pd.to_datetime(valid_df['Timestamp']).dt.floor('min'),
+        'Location': valid_df['Location'], 'Buffered Timestamp': buffered_timestamps
+    })
+    scheduled, predicted = lookup_departure_times(keys, index)
+
+    reported = reported[reported['Row'].isin(rows)]
+    mismatch_type = classify_mismatches(rows, reported, scheduled, predicted)
+
+    # Rows without any scheduled times carry no scheduled/predicted lists
+    no_data = mismatch_type == 'No Data'
+    scheduled_times = collect_times(scheduled, rows).where(~no_data, None)
+    predicted_times = collect_times(predicted, rows).where(~no_data, None)
+
+    classified = pd.DataFrame({
+        'Timestamp': valid_df['Timestamp'], 'Sign ID': valid_df['Sign ID'], 'Buffered Timestamp': buffered_timestamps,
+        'Location': valid_df['Location'], 'Reported Times': reported_times[rows], 'Scheduled Times': scheduled_times,
+        'Predicted Times': predicted_times, 'Mismatch Type': mismatch_type
+    }, columns=INCONSISTENCY_COLUMNS)
+    # Skip rows where all reported times are matched
+    classified = classified[mismatch_type != '']
+
+    missing_df = filtered_df[missing]
+    missing_fields = pd.DataFrame({
+        'Timestamp': missing_df['Timestamp'], 'Sign ID': missing_df['Sign ID'], 'Buffered Timestamp': None,
+        'Location': missing_df['Location'], 'Reported Times': reported_times[missing_df.index],
+        'Scheduled Times': None, 'Predicted Times': None, 'Mismatch Type': 'Missing Field'
+    }, columns=INCONSISTENCY_COLUMNS)
+
+    # Keep the inconsistencies in log order
+    frames = [frame for frame in (classified, missing_fields) if not frame.empty]
+    inconsistencies = pd.concat(frames) if frames else pd.DataFrame(columns=INCONSISTENCY_COLUMNS)
+
+    return inconsistencies.sort_index(), message_errors.reindex(columns=MESSAGE_ERROR_COLUMNS)
 
 # Define a function to process the data
-def process_data(df):
+def process_data(df, index=None):
     # Filter dataframe for desired locations and logic state
     filtered_df = df[(df['Location'].isin(['Newburyport', 'Beverly'])) & (df['Logic State'] == 'Normal')]
+    filtered_df = filtered_df.reset_index(drop=True)
 
-    # Create an empty DataFrame to store inconsistencies and message errors
-    inconsistencies = pd.DataFrame(columns=['Timestamp', 'Sign ID', 'Buffered Timestamp', 'Location', 'Reported Times', 'Scheduled Times', 'Predicted Times', 'Mismatch Type'])
-    message_errors = pd.DataFrame(columns=['Timestamp', 'Sign ID', 'Buffered Timestamp', 'Location', 'Message', 'Ratio'])
-
-    # Iterate over each row in the DataFrame
-    for index, row in filtered_df.iterrows():
-        timestamp = row['Timestamp']
-        sign_id = row['Sign ID']
-        location = row['Location']
-        message = row['Message']
-        parking_TT = row['Transit Parking TT']
-        ratio = row['Highway/Transit Ratio']
-
-        # Parse the message to obtain reported departure times
-        reported_times = extract_time(message)
-
-        # Check to make sure each relevant field is not null
-        if pd.isnull(timestamp) or pd.isnull(location) or pd.isnull(message) or pd.isnull(parking_TT):
-            inconsistencies = pd.concat(
-                [inconsistencies, pd.DataFrame(
-                    {'Timestamp': [timestamp], 'Sign ID': [sign_id], 'Buffered Timestamp': None, 'Location': [location], 'Reported Times': [reported_times],
-                    'Scheduled Times': None, 'Predicted Times': None, 'Mismatch Type': 'Missing Field'})],
-                ignore_index=True
-            )
-            continue
+    inconsistencies, message_errors = compare_rows(filtered_df, index if index is not None else schedule_index)
+    return inconsistencies.reset_index(drop=True), message_errors.reset_index(drop=True)
 
-        # Calculate the rounded down timestamp and add the buffer time
-        buffered_timestamp = pd.to_datetime(timestamp) + pd.Timedelta(minutes=parking_TT)
+# Number of worker processes used by the sharded comparison
+WORKERS = os.cpu_count() or 1
 
-        # Check to make sure the message is correct
-        if (ratio >= 1.2 and 'FASTER ROUTE' not in message) or ('FASTER ROUTE' in message and ratio < 1.2):
-            message_errors = pd.concat(
-                [message_errors, pd.DataFrame(
-                    {'Timestamp': [timestamp], 'Sign ID': [sign_id], 'Buffered Timestamp': [buffered_timestamp], 'Location': [location], 'Message': [message],
-                    'Ratio': [ratio]})],
-                ignore_index=True
-            )
+# Define a function to give each worker process its own database connection
+def connect_worker(source=SCHEDULE_SOURCE):
+    global conn, cursor, SCHEDULE_SOURCE
+    SCHEDULE_SOURCE = source
+    conn = psycopg2.connect(**db_config)
+    cursor = conn.cursor()
 
-        # Query the PostgreSQL database for matching schedule records at the same timestamp (up to the minute)
-        query = """
-            SELECT depart_station, scheduled_depart_time
-            FROM schedules_and_pred 
-            WHERE date_trunc('minute', timestamp) = date_trunc('minute', %s)
-            AND depart_station = %s
-            AND scheduled_depart_time >= %s
-            ORDER BY scheduled_depart_time;
-        """
-        buffer_time = pd.to_datetime(timestamp) + pd.Timedelta(minutes=parking_TT)
-        cursor.execute(query, (timestamp, location, buffer_time))
-        queried_records = cursor.fetchall()
+# Define a function to compare one (Location, date) shard against only that slice of schedules_and_pred
+def compare_shard(shard):
+    location = shard['Location'].iloc[0]
+    return compare_rows(shard, ScheduleIndex(locations=None if pd.isnull(location) else [location]))
 
-        scheduled_times = []
+# Define a function to merge shard results back into log order
+def merge_shards(frames, columns):
+    frames = [frame for frame in frames if not frame.empty]
+    merged = pd.concat(frames).sort_index() if frames else pd.DataFrame(columns=columns)
+    return merged.reset_index(drop=True)
 
-        # Check if there are three or more schedule records available
-        if len(queried_records) >= 3:
-            # Remove duplicate schedule times
-            queried_records = list(set(queried_records))
+# Define a function to process the data across a pool of worker processes, one shard per location and service day
+def process_data_parallel(df, workers=WORKERS):
+    filtered_df = df[(df['Location'].isin(['Newburyport', 'Beverly'])) & (df['Logic State'] == 'Normal')]
+    filtered_df = filtered_df.reset_index(drop=True)
 
-            # Sort the queried records by departure time in ascending order
-            queried_records.sort(key=lambda x: x[1])
+    dates = pd.to_datetime(filtered_df['Timestamp']).dt.date
+    shards = [shard for _, shard in filtered_df.groupby([filtered_df['Location'], dates], sort=True, dropna=False)]
 
-            # Select the two closest records to the buffer time
-            selected_records = queried_records[:2]
+    # Hand out the largest shards first so the pool finishes together
+    shards.sort(key=len, reverse=True)
+    with ProcessPoolExecutor(max_workers=workers, initializer=connect_worker, initargs=(SCHEDULE_SOURCE,)) as executor:
+        results = list(executor.map(compare_shard, shards))
 
-            # Extract actual departure times from the selected records
-            scheduled_times = [record[1].strftime('%H:%M') if record[1] else None for record in selected_records]
-        else:
-            scheduled_times = [record[1].strftime('%H:%M') if record[1] else None for record in queried_records]
-        
-        # Query the PostgreSQL database for matching records at the same timestamp (up to the minute)
-        query = """
-            SELECT depart_station, predicted_depart_time 
-            FROM schedules_and_pred 
-            WHERE date_trunc('minute', timestamp) = date_trunc('minute', %s)
-            AND depart_station = %s
-            AND predicted_depart_time >= %s
-            ORDER BY predicted_depart_time;
-        """
-        cursor.execute(query, (timestamp, location, buffer_time))
-        queried_records = cursor.fetchall()
-
-        # Extract actual predicted departure times from the queried records
-        predicted_times = [record[1].strftime('%H:%M') if record[1] else None for record in queried_records]
-
-        # Check if any results were returned by the query
-        if scheduled_times:
-            unmatched_reported_times = reported_times.copy()
-
-            # Check for match between predicted and reported times
-            matched_predicted_times = set()
-            for predicted_time in predicted_times:
-                if predicted_time in unmatched_reported_times:
-                    unmatched_reported_times.remove(predicted_time)
-                    matched_predicted_times.add(predicted_time)
-
-            # Check for match between scheduled and unmatched reported times
-            matched_scheduled_times = set()
-            for scheduled_time in scheduled_times:
-                if scheduled_time in unmatched_reported_times:
-                    unmatched_reported_times.remove(scheduled_time)
-                    matched_scheduled_times.add(scheduled_time)
-
-            # Determine mismatch type based on unmatched reported times
-            if any(predicted_times) and not matched_predicted_times and matched_scheduled_times and not unmatched_reported_times:
-                mismatch_type = 'Predictions'
-            elif not matched_predicted_times and not matched_scheduled_times:
-                mismatch_type = 'Complete'
-            elif unmatched_reported_times:
-                mismatch_type = 'Partial'
-            else:
-                continue  # Skip row if all reported times are matched
-
-            # Store the details in the inconsistencies DataFrame
-            inconsistencies = pd.concat(
-                [inconsistencies, pd.DataFrame(
-                    {'Timestamp': [timestamp], 'Sign ID': [sign_id], 'Buffered Timestamp': [buffered_timestamp], 'Location': [location], 'Reported Times': [reported_times],
-                     'Scheduled Times': [scheduled_times], 'Predicted Times': [predicted_times], 'Mismatch Type': [mismatch_type]})],
-                ignore_index=True
-            )
-        else:
-            # No data available in the database for the given timestamp and location
-            mismatch_type = 'No Data'
-            inconsistencies = pd.concat(
-                [inconsistencies, pd.DataFrame(
-                    {'Timestamp': [timestamp], 'Sign ID': [sign_id], 'Buffered Timestamp': [buffered_timestamp], 'Location': [location], 'Reported Times': [reported_times],
-                     'Scheduled Times': None, 'Predicted Times': None, 'Mismatch Type': [mismatch_type]})],
-                ignore_index=True
-            )
-            
+    # Row labels are log positions, so sorting on them merges the shards deterministically in log order
+    inconsistencies = merge_shards([inconsistencies for inconsistencies, _ in results], INCONSISTENCY_COLUMNS)
+    message_errors = merge_shards([message_errors for _, message_errors in results], MESSAGE_ERROR_COLUMNS)
     return inconsistencies, message_errors
 
+# Define a function to run the comparison serially or across worker processes
+def compare(df, workers=1):
+    if workers > 1:
+        return process_data_parallel(df, workers)
+    return process_data(df)
+
+# Column names of the semicolon-separated VMS log
+LOG_COLUMNS = ['Timestamp', 'Sign ID', 'Location', 'Logic State', 'Message', 'Transit Alert IDs', 'Transit Parking TT', 'Highway TT', 'Transit Departure Time', 'Transit Arrival Time', 'Total Transit TT', 'Highway/Transit Ratio']
+
+# Number of log rows held in memory at a time in streaming mode
+CHUNK_SIZE = 100000
+
+# Define a function to print the summary percentages from running counts
+def print_summary(total_rows, faster_rows, mismatch_counts):
+    print(f"Percentage of Faster MBTA Route Notifications: {faster_rows / total_rows}")
+
+    mismatched_rows = sum(mismatch_counts.values())
+    if mismatched_rows:
+        print(f"Percentage of Mismatched Entries: {mismatched_rows / total_rows}")
+        print(f"Predictions Mismatch Percentage: {mismatch_counts['Predictions'] / mismatched_rows}")
+        print(f"Partial Mismatch Percentage: {mismatch_counts['Partial'] / mismatched_rows}")
+        print(f"Complete Mismatch Percentage: {mismatch_counts['Complete'] / mismatched_rows}")
+        print(f"No Data percentage: {mismatch_counts['No Data'] / mismatched_rows}")
+    else:
+        print('No inconsistencies found.')
+
+# Define a function to read a log in bounded chunks with parsed timestamps and messages
+def read_log_chunks(file_path, chunksize=CHUNK_SIZE):
+    for chunk in pd.read_csv(file_path, sep=';', header=None, chunksize=chunksize):
+        yield parse_log_chunk(chunk)
+
+# Define a function to name the columns of raw log rows and parse their timestamps and messages
+def parse_log_chunk(chunk):
+    df = chunk.iloc[:, :-1]
+    df.columns = LOG_COLUMNS
+    df['Timestamp'] = pd.to_datetime(df['Timestamp'])
+    df['Message'] = parse_messages(df['Message'])
+    df['Faster Route'] = faster_route_flags(df['Message'])
+    return df
+
+# MBTA service days roll over at 3 AM, so late-night rows count toward the previous day
+SERVICE_DAY_START_HOUR = 3
+
+# Summary table written next to the mismatch and message error outputs
+SUMMARY_OUTPUT = 'summary_output.txt'
+
+# Group keys and counts of the summary table, which adds up across chunks, files and runs
+SUMMARY_KEYS = ['Service Day', 'Hour', 'Location', 'Sign ID']
+MISMATCH_TYPES = ['Predictions', 'Partial', 'Complete', 'No Data', 'Missing Field']
+SUMMARY_COUNTS = ['Rows', 'Faster Route', 'Faster MBTA Route'] + MISMATCH_TYPES + ['Message Errors']
+
+# Define a function to derive the summary keys of rows from their timestamp, location and sign
+def summary_keys(frame):
+    timestamps = pd.to_datetime(frame['Timestamp'])
+    return pd.DataFrame({
+        'Service Day': (timestamps - pd.Timedelta(hours=SERVICE_DAY_START_HOUR)).dt.strftime('%Y-%m-%d').astype('string'),
+        'Hour': timestamps.dt.hour.astype('Int64'),
+        'Location': frame['Location'].astype('string'),
+        'Sign ID': frame['Sign ID'].astype('string'),
+    })
+
+# Define a function to count rows, notifications, mismatch types and message errors per group in one grouped pass
+def summarize(df=None, processed=None, message_errors=None):
+    # Stack every log row, inconsistency and message error as one indicator row each, then add them up together
+    indicators = []
+    if df is not None:
+        rows = summary_keys(df)
+        rows['Rows'] = 1
+        rows['Faster Route'] = df['Faster Route'].astype(int).to_numpy()
+        rows['Faster MBTA Route'] = (df['Faster Route'] & (df['Highway/Transit Ratio'] >= 1.2)).astype(int).to_numpy()
+        indicators.append(rows)
+    if processed is not None:
+        mismatches = summary_keys(processed)
+        for mismatch_type in MISMATCH_TYPES:
+            mismatches[mismatch_type] = (processed['Mismatch Type'] == mismatch_type).astype(int).to_numpy()
+        indicators.append(mismatches)
+    if message_errors is not None:
+        errors = summary_keys(message_errors)
+        errors['Message Errors'] = 1
+        indicators.append(errors)
+    return merge_summaries(indicators)
+
+# Define a function to merge summary tables from chunks, files or earlier runs
+def merge_summaries(summaries):
+    summaries = [summary for summary in summaries if not summary.empty]
+    if not summaries:
+        return pd.DataFrame(columns=SUMMARY_KEYS + SUMMARY_COUNTS)
+    merged = pd.concat(summaries, ignore_index=True).reindex(columns=SUMMARY_KEYS + SUMMARY_COUNTS)
+    merged[SUMMARY_COUNTS] = merged[SUMMARY_COUNTS].fillna(0).astype(np.int64)
+    return merged.groupby(SUMMARY_KEYS, dropna=False, sort=True)[SUMMARY_COUNTS].sum().reset_index()
+
+# Define a function to read a saved summary table with the key types summarize produces
+def read_summary(path):
+    summary = pd.read_csv(path, dtype={'Service Day': 'string', 'Location': 'string', 'Sign ID': 'string'})
+    summary['Hour'] = summary['Hour'].astype('Int64')
+    return summary
+
+# Define a function to print the summary percentages and the per-location and per-hour breakdowns of a summary table
+def report_summary(summary):
+    totals = summary[SUMMARY_COUNTS].sum()
+    if not totals['Rows']:
+        print('No rows validated.')
+        return
+    print_summary(totals['Rows'], totals['Faster MBTA Route'], Counter({name: totals[name] for name in MISMATCH_TYPES if totals[name]}))
+
+    for key in ['Location', 'Hour']:
+        grouped = summary.groupby(key, dropna=False)[SUMMARY_COUNTS].sum()
+        grouped = grouped[grouped['Rows'] > 0]
+        mismatches = grouped[MISMATCH_TYPES].sum(axis=1)
+        print(f"By {key}:")
+        for value, counts in grouped.iterrows():
+            print(f"  {value}: {counts['Rows']} rows, {mismatches[value] / counts['Rows']:.3f} mismatched, "
+                  f"{counts['Faster MBTA Route'] / counts['Rows']:.3f} faster route, {counts['Message Errors']} message errors")
+
+# Define a function to validate a log in bounded chunks, appending results as each chunk is compared
+def stream_file(file_path, chunksize=CHUNK_SIZE, workers=1):
+    summary = merge_summaries([])
+    mismatches_written = False
+    message_errors_written = False
+
+    for df in read_log_chunks(file_path, chunksize):
+        # Summarize every row, not just the rows the comparison covers
+        all_rows = df
+        df = df[(df['Location'].isin(['Newburyport', 'Beverly'])) & (df['Logic State'] == 'Normal')]
+        processed, message_errors = compare(df, workers)
+        summary = merge_summaries([summary, summarize(all_rows, processed, message_errors)])
+
+        # Append each chunk's results so only one chunk is ever held in memory
+        if not processed.empty:
+            processed.to_csv("mismatch_output.txt", mode='a' if mismatches_written else 'w', header=not mismatches_written, index=False)
+            mismatches_written = True
+        if not message_errors.empty:
+            message_errors.to_csv("message_error_output.txt", mode='a' if message_errors_written else 'w', header=not message_errors_written, index=False)
+            message_errors_written = True
+
+    summary.to_csv(SUMMARY_OUTPUT, index=False)
+    report_summary(summary)
+    if message_errors_written:
+        print('Message Errors found.')
+
+# Define a function to create the tables that persist incremental validation results
+def create_validation_tables():
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS vms_watermarks (
+            sign_id VARCHAR(255) PRIMARY KEY,
+            last_timestamp TIMESTAMP,
+            rows_at_timestamp INTEGER
+        )
+    """)
+    # Watermarks stored before the count was kept have it NULL, which skips every row at their timestamp as before
+    cursor.execute("ALTER TABLE vms_watermarks ADD COLUMN IF NOT EXISTS rows_at_timestamp INTEGER")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS vms_inconsistencies (
+            id SERIAL PRIMARY KEY,
+            timestamp TIMESTAMP,
+            sign_id VARCHAR(255),
+            buffered_timestamp TIMESTAMP,
+            location VARCHAR(255),
+            reported_times VARCHAR(5)[],
+            scheduled_times VARCHAR(5)[],
+            predicted_times VARCHAR(5)[],
+            mismatch_type VARCHAR(32)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS vms_message_errors (
+            id SERIAL PRIMARY KEY,
+            timestamp TIMESTAMP,
+            sign_id VARCHAR(255),
+            buffered_timestamp TIMESTAMP,
+            location VARCHAR(255),
+            message TEXT,
+            ratio DOUBLE PRECISION
+        )
+    """)
+    # The summary table keyed like SUMMARY_KEYS, a missing service day, location or sign stored as '' and a missing
+    # hour as -1 so the key stays unique
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS vms_validation_summary (
+            service_day VARCHAR(10) NOT NULL,
+            hour INTEGER NOT NULL,
+            location VARCHAR(255) NOT NULL,
+            sign_id VARCHAR(255) NOT NULL,
+            {', '.join(f'{summary_column(name)} BIGINT NOT NULL DEFAULT 0' for name in SUMMARY_COUNTS)},
+            PRIMARY KEY (service_day, hour, location, sign_id)
+        )
+    """)
+    conn.commit()
+
+# Define a function to name the database column holding a summary count
+def summary_column(name):
+    return name.lower().replace(' ', '_')
+
+# Define a function to read the accumulated summary table of every incremental run
+def load_stored_summary():
+    columns = ['service_day', 'hour', 'location', 'sign_id'] + [summary_column(name) for name in SUMMARY_COUNTS]
+    cursor.execute(f"SELECT {', '.join(columns)} FROM vms_validation_summary")
+    stored = pd.DataFrame(cursor.fetchall(), columns=SUMMARY_KEYS + SUMMARY_COUNTS)
+    conn.commit()
+
+    stored['Hour'] = stored['Hour'].astype('Int64').replace(-1, pd.NA)
+    for key in ['Service Day', 'Location', 'Sign ID']:
+        stored[key] = stored[key].astype('string').replace('', pd.NA)
+    return merge_summaries([stored])
+
+# Define a function to convert a result frame into rows psycopg2 can insert
+def database_rows(frame):
+    return [
+        tuple(value if isinstance(value, list) else None if pd.isnull(value) else str(value) if column == 'Sign ID' else value
+              for column, value in zip(frame.columns, row))
+        for row in frame.itertuples(index=False)
+    ]
+
+# Define a function to load the last processed timestamp of every sign, with how many rows at it were validated
+def load_watermarks():
+    cursor.execute("SELECT sign_id, last_timestamp, rows_at_timestamp FROM vms_watermarks")
+    return {sign_id: (pd.Timestamp(last_timestamp), rows_at_timestamp) for sign_id, last_timestamp, rows_at_timestamp in cursor.fetchall()}
+
+# Define a function to key rows by sign for the watermarks, rows without a sign sharing the '' key
+def watermark_keys(df):
+    return df['Sign ID'].astype('string').fillna('')
+
+# Rows logged before any timestamped row of their sign are watermarked at this time
+UNTIMED_WATERMARK = pd.Timestamp('1970-01-01')
+
+# Define a function to watermark rows without a timestamp at their sign's previous one, carried across chunks in last_timestamps
+def watermark_timestamps(df, last_timestamps):
+    keys = watermark_keys(df)
+    timestamps = df['Timestamp'].groupby(keys).ffill()
+    timestamps = timestamps.fillna(pd.to_datetime(keys.map(last_timestamps))).fillna(UNTIMED_WATERMARK)
+    last_timestamps.update(timestamps.groupby(keys).last())
+    return timestamps
+
+# Define a function to keep only the rows not validated yet: rows after their sign's watermark, and rows at it past the
+# ones already validated there, counting the rows at each watermark across chunks in seen
+def select_new_rows(df, timestamps, watermarks, seen):
+    keys = watermark_keys(df)
+    watermark = pd.to_datetime(keys.map({sign_id: timestamp for sign_id, (timestamp, _) in watermarks.items()}))
+    validated = keys.map({sign_id: count for sign_id, (_, count) in watermarks.items()}).astype(float)
+
+    # A count stored as NULL compares false, so every row at that watermark is skipped
+    at_watermark = timestamps == watermark
+    position = at_watermark.astype(int).groupby(keys).cumsum() + keys.map(seen).fillna(0)
+    seen.update(at_watermark.groupby(keys).sum().to_dict())
+    return df[watermark.isna() | (timestamps > watermark) | (at_watermark & (position > validated))]
+
+# Define a function to store one batch of results, summary counts and watermarks in a single transaction
+def store_results(new_df, timestamps, processed, message_errors):
+    execute_values(cursor, """
+        INSERT INTO vms_inconsistencies (timestamp, sign_id, buffered_timestamp, location, reported_times, scheduled_times, predicted_times, mismatch_type)
+        VALUES %s
+    """, database_rows(processed[INCONSISTENCY_COLUMNS]))
+    execute_values(cursor, """
+        INSERT INTO vms_message_errors (timestamp, sign_id, buffered_timestamp, location, message, ratio)
+        VALUES %s
+    """, database_rows(message_errors[MESSAGE_ERROR_COLUMNS]))
+
+    # Add this batch's summary to the stored one
+    summary = summarize(new_df, processed, message_errors)
+    counts = [summary_column(name) for name in SUMMARY_COUNTS]
+    summary_rows = [
+        ('' if pd.isna(row[0]) else row[0], -1 if pd.isna(row[1]) else int(row[1]))
+        + tuple('' if pd.isna(value) else value for value in row[2:4]) + tuple(int(count) for count in row[4:])
+        for row in summary[SUMMARY_KEYS + SUMMARY_COUNTS].itertuples(index=False)
+    ]
+    execute_values(cursor, f"""
+        INSERT INTO vms_validation_summary (service_day, hour, location, sign_id, {', '.join(counts)}) VALUES %s
+        ON CONFLICT (service_day, hour, location, sign_id) DO UPDATE SET
+        {', '.join(f'{column} = vms_validation_summary.{column} + EXCLUDED.{column}' for column in counts)}
+    """, summary_rows)
+
+    # Move each sign's watermark to its latest row, counting the rows validated at it so a later run skips only those
+    keys = watermark_keys(new_df)
+    latest = timestamps.groupby(keys).max()
+    at_latest = (timestamps == pd.to_datetime(keys.map(latest))).groupby(keys).sum()
+    execute_values(cursor, """
+        INSERT INTO vms_watermarks (sign_id, last_timestamp, rows_at_timestamp) VALUES %s
+        ON CONFLICT (sign_id) DO UPDATE SET
+        last_timestamp = GREATEST(vms_watermarks.last_timestamp, EXCLUDED.last_timestamp),
+        rows_at_timestamp = CASE
+            WHEN EXCLUDED.last_timestamp > vms_watermarks.last_timestamp THEN EXCLUDED.rows_at_timestamp
+            WHEN EXCLUDED.last_timestamp = vms_watermarks.last_timestamp THEN vms_watermarks.rows_at_timestamp + EXCLUDED.rows_at_timestamp
+            ELSE vms_watermarks.rows_at_timestamp
+        END
+    """, [(sign_id, last_timestamp.to_pydatetime(), int(at_latest[sign_id])) for sign_id, last_timestamp in latest.items()])
+
+    conn.commit()
+
+# Define a function to validate only the rows logged since the last run, accumulating results in the database
+def validate_incremental(file_path, chunksize=CHUNK_SIZE, workers=1):
+    create_validation_tables()
+    watermarks = load_watermarks()
+    last_timestamps = {}
+    seen = Counter()
+    new_rows = 0
+
+    for df in read_log_chunks(file_path, chunksize):
+        timestamps = watermark_timestamps(df, last_timestamps)
+        new_df = select_new_rows(df, timestamps, watermarks, seen)
+        if new_df.empty:
+            continue
+
+        processed, message_errors = compare(new_df, workers)
+        store_results(new_df, timestamps[new_df.index], processed, message_errors)
+        new_rows += len(new_df)
+
+    print(f"Validated {new_rows} new rows")
+
+    # Report the summary over everything validated so far from the stored table
+    summary = load_stored_summary()
+    summary.to_csv(SUMMARY_OUTPUT, index=False)
+    report_summary(summary)
+    if summary['Message Errors'].sum():
+        print('Message Errors found.')
+
+# Directory of the service day/location-partitioned Parquet archive of parsed logs
+ARCHIVE_DIR = 'vms_archive'
+
+# Typed columns stored in the archive, besides the Date and Location partition keys
+ARCHIVE_TEXT_COLUMNS = ['Sign ID', 'Logic State', 'Message', 'Transit Alert IDs', 'Transit Departure Time', 'Transit Arrival Time']
+ARCHIVE_NUMERIC_COLUMNS = ['Transit Parking TT', 'Highway TT', 'Total Transit TT', 'Highway/Transit Ratio']
+
+def archive_schema():
+    import pyarrow as pa
+    return pa.schema(
+        [('Timestamp', pa.timestamp('us'))]
+        + [(column, pa.string()) for column in ARCHIVE_TEXT_COLUMNS]
+        + [(column, pa.float64()) for column in ARCHIVE_NUMERIC_COLUMNS]
+        + [('Faster Route', pa.bool_()), ('Reported Minutes', pa.list_(pa.int32())), ('Date', pa.string()), ('Location', pa.string())]
+    )
+
+def archive_partitioning():
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    return ds.partitioning(pa.schema([('Date', pa.string()), ('Location', pa.string())]), flavor='hive')
+
+# Define a function to convert a VMS log into the Parquet archive, one chunk at a time
+def ingest_file(file_path, archive_dir=ARCHIVE_DIR, chunksize=CHUNK_SIZE):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    # Remove the fragments of an earlier ingest of the same file so re-runs replace it, matching the exact
+    # names written below so logs whose names start with this one keep theirs
+    file_stem = os.path.splitext(os.path.basename(file_path))[0]
+    fragment_pattern = re.compile(rf'{re.escape(file_stem)}-\d+-\d+\.parquet')
+    for fragment in glob.glob(os.path.join(archive_dir, '*', '*', '*.parquet')):
+        if fragment_pattern.fullmatch(os.path.basename(fragment)):
+            os.remove(fragment)
+
+    schema = archive_schema()
+    archived_rows = 0
+    for chunk_index, df in enumerate(read_log_chunks(file_path, chunksize)):
+        reported = extract_reported_minutes(df['Message'])
+        df['Reported Minutes'] = reported.groupby('Row')['Time'].agg(list).reindex(df.index)
+        df['Reported Minutes'] = df['Reported Minutes'].apply(lambda minutes: minutes if isinstance(minutes, list) else [])
+        # Partition by service day, like the summary, so a date also covers the hours after midnight
+        df['Date'] = (df['Timestamp'] - pd.Timedelta(hours=SERVICE_DAY_START_HOUR)).dt.strftime('%Y-%m-%d')
+        for column in ARCHIVE_TEXT_COLUMNS + ['Location']:
+            df[column] = df[column].apply(lambda value: None if pd.isnull(value) else str(value))
+        for column in ARCHIVE_NUMERIC_COLUMNS:
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+
+        table = pa.Table.from_pandas(df[schema.names], schema=schema, preserve_index=False)
+        ds.write_dataset(table, archive_dir, format='parquet', partitioning=archive_partitioning(),
+                         basename_template=f'{file_stem}-{chunk_index}-{{i}}.parquet', existing_data_behavior='overwrite_or_ignore')
+        archived_rows += len(df)
+
+    print(f"Archived {archived_rows} rows from {file_path} into {archive_dir}")
+
+# Define a function to read only the needed partitions and columns of the archive
+def read_archive(archive_dir=ARCHIVE_DIR, dates=None, locations=None, logic_state=None, columns=None):
+    import pyarrow.parquet as pq
+
+    filters = []
+    if dates:
+        filters.append(('Date', 'in', list(dates)))
+    if locations:
+        filters.append(('Location', 'in', list(locations)))
+    if logic_state:
+        filters.append(('Logic State', '=', logic_state))
+
+    table = pq.read_table(archive_dir, columns=columns, filters=filters or None, memory_map=True,
+                          partitioning=archive_partitioning(), schema=archive_schema())
+    return table.to_pandas()
+
+# Define a function to validate archived logs without re-parsing the raw exports
+def validate_archive(archive_dir=ARCHIVE_DIR, dates=None, workers=1):
+    # The summary covers every archived row, so only read the columns it needs
+    all_rows = read_archive(archive_dir, dates, columns=['Timestamp', 'Sign ID', 'Location', 'Faster Route', 'Highway/Transit Ratio'])
+
+    df = read_archive(archive_dir, dates, locations=['Newburyport', 'Beverly'], logic_state='Normal',
+                      columns=['Timestamp', 'Sign ID', 'Location', 'Logic State', 'Message', 'Transit Parking TT', 'Highway/Transit Ratio', 'Faster Route', 'Reported Minutes'])
+    # Partitions come back grouped by location, so restore chronological order
+    df = df.sort_values('Timestamp', kind='stable').reset_index(drop=True)
+    processed, message_errors = compare(df, workers)
+
+    if not processed.empty:
+        processed.to_csv("mismatch_output.txt", index=False)
+    summary = summarize(all_rows, processed, message_errors)
+    summary.to_csv(SUMMARY_OUTPUT, index=False)
+    report_summary(summary)
+
+    if not message_errors.empty:
+        message_errors.to_csv("message_error_output.txt", index=False)
+        print('Message Errors found.')
+
+# Seconds between checks of a followed log for new lines
+FOLLOW_INTERVAL = 1
+
+# Span of recent schedules_and_pred records follow mode keeps in memory
+FOLLOW_WINDOW = timedelta(minutes=30)
+
+# Longest follow mode holds a line back waiting for the poller to write its minute
+FOLLOW_MAX_DELAY = timedelta(minutes=2)
+
+# Define a class holding only the most recent schedules_and_pred records, topped up as the poller writes them
+class RollingScheduleIndex(ScheduleIndex):
+    def __init__(self, window=FOLLOW_WINDOW, source=None):
+        super().__init__(source=source)
+        self.window = window
+        self.records = pd.DataFrame(columns=['Timestamp', 'Minute', 'Location', 'Scheduled', 'Predicted'])
+        self.entry = self.build_entry(self.records[['Minute', 'Location', 'Scheduled', 'Predicted']].copy())
+        self.latest_minute = None
+
+    # Read the records written since the last refresh and drop those that have left the window
+    def refresh(self):
+        window_start = datetime.now() - self.window
+        since = max(window_start, self.records['Timestamp'].max()) if not self.records.empty else window_start
+
+        # The as-of view rebuilds the same per-minute records from the delta tables
+        table = 'schedules_and_pred_asof' if self.source == 'intervals' else 'schedules_and_pred'
+        cursor.execute(f"""
+            SELECT timestamp, minute_bucket, depart_station, scheduled_depart_time, predicted_depart_time
+            FROM {table}
+            WHERE timestamp > %s
+        """, (since,))
+        new_records = pd.DataFrame(cursor.fetchall(), columns=['Timestamp', 'Minute', 'Location', 'Scheduled', 'Predicted'])
+        conn.commit()
+
+        expired = (self.records['Timestamp'] < window_start).any()
+        if new_records.empty and not expired:
+            return
+
+        frames = [frame for frame in (self.records, new_records) if not frame.empty]
+        records = pd.concat(frames, ignore_index=True) if frames else self.records
+        self.records = records[records['Timestamp'] >= window_start].reset_index(drop=True)
+        self.entry = self.build_entry(self.records[['Minute', 'Location', 'Scheduled', 'Predicted']].copy())
+        self.latest_minute = pd.Timestamp(self.records['Minute'].max()) if not self.records.empty else None
+
+    # Every minute in the window is served from the one entry, whatever its day
+    def day(self, day):
+        return self.entry
+
+# Define a function to yield the complete lines appended to a log on every check, reopening it when rotated or truncated
+def follow_lines(file_path, from_start=False, interval=FOLLOW_INTERVAL):
+    f = open(file_path, 'rb')
+    if not from_start:
+        f.seek(0, os.SEEK_END)
+    partial = b''
+    try:
+        while True:
+            data = f.read()
+            if data:
+                lines = (partial + data).split(b'\n')
+                partial = lines.pop()
+                yield [line.decode('utf-8', errors='replace') for line in lines if line.strip()]
+                continue
+
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                stat = None
+            if stat is not None and (stat.st_ino != os.fstat(f.fileno()).st_ino or stat.st_size < f.tell()):
+                f.close()
+                f = open(file_path, 'rb')
+                partial = b''
+                continue
+
+            yield []
+            time.sleep(interval)
+    finally:
+        f.close()
+
+# Define a function to validate a growing log as it is written, holding each line until the poller has written its minute
+def follow_file(file_path, from_start=False, window=FOLLOW_WINDOW, max_delay=FOLLOW_MAX_DELAY, interval=FOLLOW_INTERVAL):
+    index = RollingScheduleIndex(window)
+    pending = pd.DataFrame(columns=LOG_COLUMNS + ['Faster Route'])
+    summary = merge_summaries([])
+    mismatches_written = False
+    message_errors_written = False
+
+    print(f"Following {file_path}")
+    try:
+        for lines in follow_lines(file_path, from_start, interval):
+            if lines:
+                df = parse_log_chunk(pd.read_csv(io.StringIO('\n'.join(lines)), sep=';', header=None))
+                summary = merge_summaries([summary, summarize(df)])
+                df = df[(df['Location'].isin(['Newburyport', 'Beverly'])) & (df['Logic State'] == 'Normal')]
+                pending = pd.concat([pending, df], ignore_index=True) if not pending.empty else df.reset_index(drop=True)
+            if pending.empty:
+                continue
+
+            # A line is ready once its minute is in the window, or once it has waited as long as allowed
+            index.refresh()
+            ready = pending['Timestamp'].isna() | (pending['Timestamp'] < datetime.now() - max_delay)
+            if index.latest_minute is not None:
+                ready |= pending['Timestamp'].dt.floor('min') <= index.latest_minute
+            if not ready.any():
+                continue
+
+            processed, message_errors = process_data(pending[ready], index)
+            pending = pending[~ready].reset_index(drop=True)
+
+            for timestamp, sign_id, location, mismatch_type in processed[['Timestamp', 'Sign ID', 'Location', 'Mismatch Type']].itertuples(index=False):
+                print(f"{timestamp} sign {sign_id} at {location}: {mismatch_type} mismatch")
+            for timestamp, sign_id, location, ratio in message_errors[['Timestamp', 'Sign ID', 'Location', 'Ratio']].itertuples(index=False):
+                print(f"{timestamp} sign {sign_id} at {location}: message error at ratio {ratio}")
+
+            # Append as the results come in, like streaming mode, and keep the summary table current
+            if not processed.empty:
+                processed.to_csv("mismatch_output.txt", mode='a' if mismatches_written else 'w', header=not mismatches_written, index=False)
+                mismatches_written = True
+            if not message_errors.empty:
+                message_errors.to_csv("message_error_output.txt", mode='a' if message_errors_written else 'w', header=not message_errors_written, index=False)
+                message_errors_written = True
+            summary = merge_summaries([summary, summarize(processed=processed, message_errors=message_errors)])
+            summary.to_csv(SUMMARY_OUTPUT, index=False)
+    except KeyboardInterrupt:
+        pass
+
+    report_summary(summary)
+    if message_errors_written:
+        print('Message Errors found.')
+
+# Directories for the per-file and combined outputs of batch mode, and for its cached results
+BATCH_OUTPUT_DIR = 'batch_output'
+BATCH_CACHE_DIR = '.vms_cache'
+
+# Define a function to expand directories and glob patterns into a sorted list of log files
+def expand_log_paths(patterns):
+    paths = []
+    for pattern in patterns:
+        matches = glob.glob(os.path.join(pattern, '*')) if os.path.isdir(pattern) else glob.glob(pattern)
+        paths.extend(path for path in matches if os.path.isfile(path))
+    return sorted(set(paths))
+
+# Define a function to hash a file's contents without reading it into memory at once
+def content_hash(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Define a function to fingerprint the schedule records between two minutes, so cached results are redone when they change
+def schedule_fingerprint(start, end):
+    if start is None:
+        return []
+    if SCHEDULE_SOURCE == 'intervals':
+        cursor.execute("SELECT count(*), max(cycle_time) FROM schedules_and_pred_cycles WHERE cycle_time >= %s AND cycle_time < %s", (start, end))
+        cycles = cursor.fetchone()
+        cursor.execute("""
+            SELECT count(*), max(id) FROM schedules_and_pred_intervals
+            WHERE valid_from < %s AND (valid_to IS NULL OR valid_to > %s)
+        """, (end, start))
+        fingerprint = list(cycles) + list(cursor.fetchone())
+    else:
+        cursor.execute("""
+            SELECT count(*), max(id) FROM schedules_and_pred
+            WHERE timestamp >= %s AND timestamp < %s AND minute_bucket >= %s AND minute_bucket < %s
+        """, (start, end) * 2)
+        fingerprint = list(cursor.fetchone())
+    conn.commit()
+    return [str(value) for value in fingerprint]
+
+# Define a function to give each batch worker its own connection and schedule index
+def connect_batch_worker(source=SCHEDULE_SOURCE):
+    global schedule_index
+    connect_worker(source)
+    schedule_index = ScheduleIndex()
+
+# Define a function to validate one log into its cache directory, recording the schedule range it was compared against
+def validate_cached_file(file_path, cache_path):
+    df = parse_log_chunk(pd.read_csv(file_path, sep=';', header=None))
+
+    # Rows are matched to the schedule records of their own minute, so the file depends on that span only
+    minutes = df['Timestamp'].dropna().dt.floor('min')
+    start = minutes.min().to_pydatetime() if not minutes.empty else None
+    end = (minutes.max() + pd.Timedelta(minutes=1)).to_pydatetime() if not minutes.empty else None
+    fingerprint = schedule_fingerprint(start, end)
+
+    processed, message_errors = process_data(df)
+
+    os.makedirs(cache_path, exist_ok=True)
+    processed.to_csv(os.path.join(cache_path, 'mismatch_output.txt'), index=False)
+    message_errors.to_csv(os.path.join(cache_path, 'message_error_output.txt'), index=False)
+    summarize(df, processed, message_errors).to_csv(os.path.join(cache_path, SUMMARY_OUTPUT), index=False)
+    with open(os.path.join(cache_path, 'range.json'), 'w') as f:
+        json.dump({'start': start.isoformat() if start else None, 'end': end.isoformat() if end else None, 'fingerprint': fingerprint}, f)
+    return read_summary(os.path.join(cache_path, SUMMARY_OUTPUT))
+
+# Define a function to load a file's cached summary table if its schedule range has not changed since
+def load_cached_summary(cache_path):
+    try:
+        with open(os.path.join(cache_path, 'range.json')) as f:
+            cached_range = json.load(f)
+        summary = read_summary(os.path.join(cache_path, SUMMARY_OUTPUT))
+    except (OSError, ValueError):
+        return None
+
+    start = datetime.fromisoformat(cached_range['start']) if cached_range['start'] else None
+    end = datetime.fromisoformat(cached_range['end']) if cached_range['end'] else None
+    if schedule_fingerprint(start, end) != cached_range['fingerprint']:
+        return None
+    return summary
+
+# Define a function to validate many logs without the file dialog, in parallel and skipping files already validated
+def validate_batch(patterns, output_dir=BATCH_OUTPUT_DIR, cache_dir=BATCH_CACHE_DIR, workers=1):
+    file_paths = expand_log_paths(patterns)
+    if not file_paths:
+        print('No log files found.')
+        return
+
+    # Results are cached under each file's content hash and the schedule source it was compared against
+    cache_paths = {file_path: os.path.join(cache_dir, f"{content_hash(file_path)}-{SCHEDULE_SOURCE}") for file_path in file_paths}
+    summaries = {}
+    for file_path in file_paths:
+        summary = load_cached_summary(cache_paths[file_path])
+        if summary is not None:
+            summaries[file_path] = summary
+    stale = [file_path for file_path in file_paths if file_path not in summaries]
+    print(f"Validating {len(stale)} of {len(file_paths)} files, {len(summaries)} unchanged since the last run")
+
+    if len(stale) > 1 and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=connect_batch_worker, initargs=(SCHEDULE_SOURCE,)) as executor:
+            summaries.update(zip(stale, executor.map(validate_cached_file, stale, [cache_paths[file_path] for file_path in stale])))
+    else:
+        for file_path in stale:
+            summaries[file_path] = validate_cached_file(file_path, cache_paths[file_path])
+
+    # Copy each file's results next to it in the output directory and append them to the combined outputs
+    os.makedirs(output_dir, exist_ok=True)
+    written = set()
+    for file_path in file_paths:
+        file_name = os.path.basename(file_path)
+        shutil.copyfile(os.path.join(cache_paths[file_path], SUMMARY_OUTPUT), os.path.join(output_dir, f"{file_name}_{SUMMARY_OUTPUT}"))
+        for output in ['mismatch_output.txt', 'message_error_output.txt']:
+            cached = os.path.join(cache_paths[file_path], output)
+            shutil.copyfile(cached, os.path.join(output_dir, f"{file_name}_{output}"))
+
+            results = pd.read_csv(cached)
+            if results.empty:
+                continue
+            results.insert(0, 'File', file_name)
+            results.to_csv(os.path.join(output_dir, output), mode='a' if output in written else 'w', header=output not in written, index=False)
+            written.add(output)
+
+        totals = summaries[file_path][SUMMARY_COUNTS].sum()
+        print(f"{file_name}: {totals['Rows']} rows, {totals[MISMATCH_TYPES].sum()} inconsistencies, {totals['Message Errors']} message errors")
+
+    # Leave no combined output from an earlier run that this one had nothing to write to
+    for output in ['mismatch_output.txt', 'message_error_output.txt']:
+        if output not in written and os.path.exists(os.path.join(output_dir, output)):
+            os.remove(os.path.join(output_dir, output))
+
+    # The per-file summary tables add up to the combined one
+    summary = merge_summaries([summaries[file_path] for file_path in file_paths])
+    summary.to_csv(os.path.join(output_dir, SUMMARY_OUTPUT), index=False)
+    report_summary(summary)
+    if summary['Message Errors'].sum():
+        print('Message Errors found.')
+
 # Define a function that allows the user to select a file
-def select_file():
+def select_file(stream=False, chunksize=CHUNK_SIZE, ingest=False, archive_dir=ARCHIVE_DIR, workers=1, incremental=False):
+    # Imported here so the headless modes run on servers without Tk
+    import tkinter as tk
+    from tkinter import filedialog
+
     root = tk.Tk()
     root.withdraw()
     file_path = filedialog.askopenfilename()
     file_name = os.path.basename(file_path)
+    if file_path and ingest:
+        ingest_file(file_path, archive_dir, chunksize)
+        return
+    if file_path and incremental:
+        validate_incremental(file_path, chunksize, workers)
+        return
+    if file_path and stream:
+        stream_file(file_path, chunksize, workers)
+        return
     if file_path:
-        df = pd.read_csv(file_path, sep=';', header=None).iloc[:, :-1]
-        df.columns = ['Timestamp', 'Sign ID', 'Location', 'Logic State', 'Message', 'Transit Alert IDs', 'Transit Parking TT', 'Highway TT', 'Transit Departure Time', 'Transit Arrival Time', 'Total Transit TT', 'Highway/Transit Ratio']
-        df['Timestamp'] = pd.to_datetime(df['Timestamp'])
-        df['Message'] = df['Message'].apply(parse_message)
+        df = parse_log_chunk(pd.read_csv(file_path, sep=';', header=None))
         # The final processed dataframe
-        processed, message_errors = process_data(df)
+        processed, message_errors = compare(df, workers)
 
-    mbta_faster_percentage = len(df[df['Message'].str.contains('FASTER ROUTE') & (df['Highway/Transit Ratio'] >= 1.2)]) / len(df)
-    print(f"Percentage of Faster MBTA Route Notifications: {mbta_faster_percentage}")
+    # Every count comes from one grouped pass, kept as a table that later runs can merge
+    summary = summarize(df, processed, message_errors)
+    summary.to_csv(SUMMARY_OUTPUT, index=False)
+    report_summary(summary)
 
     if not processed.empty:
-        # Determine percentage of inconsistencies that are mismatched on either predictions or schedules
-        mismatch_percentage = len(processed)/len(df)
-        predictions_percentage = len(processed[processed['Mismatch Type'] == 'Predictions']) / len(processed)
-        partial_mismatch = len(processed[processed['Mismatch Type'] == 'Partial']) / len(processed)
-        complete_mismatch = len(processed[processed['Mismatch Type'] == 'Complete']) / len(processed)
-        no_data_percentage = len(processed[processed['Mismatch Type'] == 'No Data']) / len(processed)
-
         #processed.to_csv(f"{file_name}_validation_output.txt", index=False)
         processed.to_csv("mismatch_output.txt", index=False)
-        
-        print(f"Percentage of Mismatched Entries: {mismatch_percentage}")
-        print(f"Predictions Mismatch Percentage: {predictions_percentage}")
-        print(f"Partial Mismatch Percentage: {partial_mismatch}")
-        print(f"Complete Mismatch Percentage: {complete_mismatch}")
-        print(f"No Data percentage: {no_data_percentage}")
         print(processed)
-    else:
-        print('No inconsistencies found.')
         
     if not message_errors.empty:
         message_errors.to_csv("message_error_output.txt", index=False)
         print('Message Errors found.')
 
-select_file()
\ No newline at end of file
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare VMS sign logs against schedules_and_pred.')
+    parser.add_argument('--stream', action='store_true', help='read the log in bounded chunks to keep memory flat')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='rows per chunk in streaming and ingest modes')
+    parser.add_argument('--ingest', action='store_true', help='convert the selected log into the Parquet archive instead of validating it')
+    parser.add_argument('--from-archive', action='store_true', help='validate logs from the Parquet archive instead of selecting a file')
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR, help='location of the Parquet archive')
+    parser.add_argument('--dates', nargs='+', help='service days (YYYY-MM-DD, each starting at 3 AM) to read from the archive, all if omitted')
+    parser.add_argument('--incremental', action='store_true', help='validate only rows not yet validated, tracked by each sign\'s stored watermark, and keep results in the database')
+    parser.add_argument('--delta', action='store_true', help='read schedules from the delta tables written by predictions_4.0.py --delta')
+    parser.add_argument('--workers', type=int, default=1, help=f'compare (location, service day) shards across this many processes, e.g. {WORKERS}')
+    parser.add_argument('--follow', metavar='FILE', help='validate lines as they are appended to a live log, until interrupted')
+    parser.add_argument('--from-start', action='store_true', help='in follow mode, also validate the lines already in the log')
+    parser.add_argument('--report', nargs='+', metavar='SUMMARY', help='merge saved summary tables and print their report instead of validating')
+    parser.add_argument('--batch', nargs='+', metavar='PATH', help='validate every log in these directories or glob patterns without the file dialog, one file per worker')
+    parser.add_argument('--output-dir', default=BATCH_OUTPUT_DIR, help='where batch mode writes per-file and combined outputs')
+    parser.add_argument('--cache-dir', default=BATCH_CACHE_DIR, help='where batch mode caches results by file content hash')
+    args = parser.parse_args()
+
+    if args.delta:
+        SCHEDULE_SOURCE = 'intervals'
+        schedule_index = ScheduleIndex(source=SCHEDULE_SOURCE)
+
+    if args.report:
+        report_summary(merge_summaries([read_summary(path) for path in args.report]))
+    elif args.follow:
+        follow_file(args.follow, args.from_start)
+    elif args.batch:
+        validate_batch(args.batch, args.output_dir, args.cache_dir, args.workers)
+    elif args.from_archive:
+        validate_archive(args.archive_dir, args.dates, args.workers)
+    else:
+        select_file(stream=args.stream, chunksize=args.chunk_size, ingest=args.ingest, archive_dir=args.archive_dir, workers=args.workers, incremental=args.incremental)
\ No newline at end of file
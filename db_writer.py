@@ -0,0 +1,153 @@
+import csv
+import os
+import time
+import psycopg2
+from psycopg2.extras import execute_values
+from predictions_config import db_config
+from poller_metrics import metrics
+
+# Most rows held for retry while the database is unreachable; the oldest are dropped beyond this
+MAX_HELD_ROWS = 10000
+
+# Where rows the database refuses are set aside, by table
+REJECT_FILE = '{table}_rejected.csv'
+
+# Buffers a poll cycle's rows and writes them over one persistent connection
+class DatabaseWriter:
+    def __init__(self, table, columns, max_attempts=3, retry_delay=1, max_held_rows=MAX_HELD_ROWS):
+        self.table = table
+        self.columns = columns
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_held_rows = max_held_rows
+        self.conn = None
+        self.rows = []
+
+    def connect(self):
+        # Reuse the open connection, reconnecting only if it has been closed
+        if self.conn is None or self.conn.closed:
+            self.conn = psycopg2.connect(**db_config)
+        return self.conn
+
+    def close(self):
+        if self.conn is not None and not self.conn.closed:
+            self.conn.close()
+        self.conn = None
+
+    def add(self, values):
+        self.rows.append(values)
+
+    def pending(self):
+        return bool(self.rows)
+
+    def held(self):
+        # Every row waiting to be written
+        return self.rows
+
+    def drop(self, count=None):
+        # Forget the oldest count rows, or every held row
+        self.rows = [] if count is None else self.rows[count:]
+
+    def discard(self, rows):
+        # Forget the given held rows, keeping the rest in order
+        discarded = {id(row) for row in rows}
+        self.rows = [row for row in self.rows if id(row) not in discarded]
+
+    def reject(self, rows, error):
+        # Set the rows aside in the reject file so they are not retried forever
+        path = REJECT_FILE.format(table=self.table)
+        new_file = not os.path.exists(path)
+        with open(path, 'a', newline='') as file:
+            csv_writer = csv.writer(file)
+            if new_file:
+                csv_writer.writerow(self.columns)
+            csv_writer.writerows(rows)
+        metrics.increment('db_rows_rejected_total', len(rows), table=self.table)
+        print(f"{self.table} rejected {len(rows)} rows, moved them to {path}: {error}")
+        self.discard(rows)
+
+    def refused_rows(self, cursor):
+        # Try each held row on its own, rolling every attempt back, and return the ones the database refuses
+        query = f"INSERT INTO {self.table} ({', '.join(self.columns)}) VALUES %s"
+        refused = []
+        for row in self.held():
+            cursor.execute('SAVEPOINT row_check')
+            try:
+                execute_values(cursor, query, [row])
+            except psycopg2.Error:
+                refused.append(row)
+            cursor.execute('ROLLBACK TO SAVEPOINT row_check')
+        return refused
+
+    def write(self, cursor):
+        # Define multi-row INSERT query, returning the number of rows stored
+        query = f"INSERT INTO {self.table} ({', '.join(self.columns)}) VALUES %s"
+        execute_values(cursor, query, self.rows, page_size=len(self.rows))
+        return len(self.rows)
+
+    def written(self):
+        # Called once the cycle's transaction has committed
+        self.rows = []
+
+    def flush(self):
+        if not self.pending():
+            return 0
+
+        start_time = time.monotonic()
+
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                conn = self.connect()
+                with conn.cursor() as cursor:
+                    stored = self.write(cursor)
+                conn.commit()
+                break
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as error:
+                # Drop the broken connection and try again on a fresh one
+                self.close()
+                metrics.increment('db_write_errors_total', table=self.table)
+                if attempt == self.max_attempts:
+                    print(f"Failed to write to {self.table}, keeping the rows for the next cycle: {error}")
+                    excess = len(self.held()) - self.max_held_rows
+                    if excess > 0:
+                        self.drop(excess)
+                        print(f"Dropped the oldest {excess} rows held for {self.table}")
+                    return None
+                time.sleep(self.retry_delay * attempt)
+            except psycopg2.Error as error:
+                # Any other error would fail again on the same rows, so set aside only the rows the database
+                # refuses on their own and write the rest, leaving the connection usable for the next cycle
+                metrics.increment('db_write_errors_total', table=self.table)
+                if self.conn is None or self.conn.closed:
+                    self.reject(self.held(), error)
+                    raise
+                self.conn.rollback()
+                try:
+                    with self.conn.cursor() as cursor:
+                        refused = self.refused_rows(cursor)
+                    self.conn.rollback()
+                    if refused:
+                        self.reject(refused, error)
+                    if not self.pending():
+                        return 0
+                    with self.conn.cursor() as cursor:
+                        stored = self.write(cursor)
+                    self.conn.commit()
+                    break
+                except (psycopg2.OperationalError, psycopg2.InterfaceError) as retry_error:
+                    # Lost the connection part way, so keep the remaining rows for the next cycle
+                    self.close()
+                    print(f"Failed to write to {self.table}, keeping the rows for the next cycle: {retry_error}")
+                    return None
+                except psycopg2.Error:
+                    # No single row explains the error, so the batch as a whole is refused
+                    self.conn.rollback()
+                    self.reject(self.held(), error)
+                    raise
+
+        write_latency = time.monotonic() - start_time
+        metrics.observe('db_write_seconds', write_latency, table=self.table)
+        metrics.increment('rows_written_total', stored, table=self.table)
+        print(f"Wrote {stored} rows to {self.table} in {write_latency:.3f}s")
+        self.written()
+        return write_latency
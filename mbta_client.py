@@ -0,0 +1,161 @@
+import json
+import os
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+import requests.adapters
+
+from poller_metrics import metrics, record_api_call
+
+# Decode with orjson when it is installed, it parses API responses several times faster
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+# MBTA v3 API root, MBTA_API_BASE points the pollers at another server such as benchmarks/replay_server.py
+API_BASE = os.environ.get('MBTA_API_BASE', 'https://api-v3.mbta.com').rstrip('/')
+
+# Requests allowed per window for a keyed client until the API reports its own limit
+DEFAULT_RATE_LIMIT = 1000
+RATE_LIMIT_WINDOW = 60
+
+# Connect and read timeouts in seconds
+REQUEST_TIMEOUT = (3.05, 10)
+
+# Attempts per request, and the base and cap of the jittered exponential backoff between them
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Sparse fieldsets asking each endpoint for only the attributes the pollers read. The trip relationship is always sent
+SPARSE_FIELDS = {
+    'predictions': '&fields[prediction]=arrival_time,departure_time',
+    'schedules': '&fields[schedule]=arrival_time,departure_time',
+}
+
+def sparse_url(url):
+    return url + SPARSE_FIELDS.get(urlparse(url).path.rstrip('/').rsplit('/', 1)[-1], '')
+
+def record_times(record):
+    # The three values the pollers use from a prediction or schedule: (trip ID, arrival time, departure time)
+    attributes = record['attributes']
+    return record['relationships']['trip']['data']['id'], attributes.get('arrival_time'), attributes.get('departure_time')
+
+class MBTAError(Exception):
+    pass
+
+# Token bucket sized by the x-ratelimit-* headers, shared by every thread using the client
+class RateLimiter:
+    def __init__(self, limit=DEFAULT_RATE_LIMIT, window=RATE_LIMIT_WINDOW):
+        self.lock = threading.Lock()
+        self.limit = limit
+        self.window = window
+        self.tokens = limit
+        self.updated = time.monotonic()
+        self.reset_at = None
+        self.blocked_until = 0
+
+    def refill(self, now):
+        # Top up steadily between windows, and completely once the API's window has reset
+        if self.reset_at is not None and now >= self.reset_at:
+            self.tokens = self.limit
+            self.reset_at = None
+        self.tokens = min(self.limit, self.tokens + (now - self.updated) * self.limit / self.window)
+        self.updated = now
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.blocked_until - now, (1 - self.tokens) * self.window / self.limit)
+            metrics.increment('api_rate_limit_waits_total')
+            time.sleep(wait)
+
+    def update(self, headers):
+        # Trust the API's own count of what is left in its window
+        try:
+            limit = int(headers['x-ratelimit-limit'])
+            remaining = int(headers['x-ratelimit-remaining'])
+            reset_at = float(headers['x-ratelimit-reset'])
+        except (KeyError, ValueError):
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            self.refill(now)
+            self.limit = max(limit, 1)
+            self.tokens = min(self.tokens, remaining)
+
+            # The reset header is a Unix timestamp, so convert it onto the monotonic clock
+            self.reset_at = now + max(reset_at - time.time(), 0)
+            if remaining <= 0:
+                self.blocked_until = self.reset_at
+
+# Shared MBTA session with rate limiting, timeouts and retries
+class MBTAClient:
+    def __init__(self, base=API_BASE, pool_size=10, timeout=REQUEST_TIMEOUT, max_attempts=MAX_ATTEMPTS):
+        self.base = base
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.limiter = RateLimiter()
+        self.session = requests.Session()
+        self.session.headers['Accept-Encoding'] = 'gzip'
+        self.session.mount(base, requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=pool_size))
+
+    def backoff(self, attempt, response=None):
+        # Wait out a 429 as long as the API asks, otherwise back off exponentially with full jitter
+        if response is not None and response.status_code == 429:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                return int(retry_after)
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    def get(self, url, headers=None):
+        # Return the first response that is not a retryable error, retrying transport errors, 429s and 5xx
+        for attempt in range(self.max_attempts):
+            self.limiter.acquire()
+            start_time = time.perf_counter()
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                metrics.increment('api_transport_errors_total')
+                if attempt == self.max_attempts - 1:
+                    raise MBTAError(f"Failed to make API call: {error}") from error
+                time.sleep(self.backoff(attempt))
+                continue
+
+            record_api_call(url, response, time.perf_counter() - start_time)
+            self.limiter.update(response.headers)
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_attempts - 1:
+                return response
+
+            metrics.increment('api_retries_total', status=response.status_code)
+            time.sleep(self.backoff(attempt, response))
+
+    def get_json(self, url):
+        response = self.get(url)
+        if response.status_code == 200:
+            with metrics.timer('json_parse_seconds'):
+                return loads(response.content)
+        else:
+            raise MBTAError(f"Failed to make API call. Status code: {response.status_code}")
+
+    def get_times(self, url):
+        # Fetch only the needed fields and return each record as a record_times tuple, in the API's order
+        response = self.get(sparse_url(url))
+        if response.status_code == 200:
+            with metrics.timer('json_parse_seconds'):
+                return [record_times(record) for record in loads(response.content)['data']]
+        else:
+            raise MBTAError(f"Failed to make API call. Status code: {response.status_code}")
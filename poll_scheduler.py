@@ -0,0 +1,127 @@
+import csv
+import math
+import os
+import time
+from datetime import datetime
+from poller_metrics import metrics
+
+# Seconds between poll cycles
+CYCLE_INTERVAL = 60
+
+# Seconds after each minute boundary a cycle starts, so its rows always land in that minute
+BOUNDARY_OFFSET = 1
+
+# What to do when a cycle runs past the next tick:
+# 'skip' waits for the next boundary, 'catch-up' runs every missed tick back to back, 'late' runs once now and rejoins the grid
+OVERRUN_POLICIES = ['skip', 'catch-up', 'late']
+
+# Wall-clock disagreement, in seconds, after which the grid is re-anchored (for example after an NTP step)
+CLOCK_STEP_TOLERANCE = 1
+
+CYCLE_LOG_COLUMNS = ['scheduled', 'started', 'lateness', 'duration', 'overrun', 'skipped', 'status']
+
+# Runs a function on a monotonic grid aligned to wall-clock minute boundaries
+class TickScheduler:
+    def __init__(self, interval=CYCLE_INTERVAL, policy='skip', log_path=None, offset=BOUNDARY_OFFSET):
+        if policy not in OVERRUN_POLICIES:
+            raise ValueError(f"Unknown overrun policy {policy}, expected one of {', '.join(OVERRUN_POLICIES)}")
+        self.interval = interval
+        self.policy = policy
+        self.log_path = log_path
+        self.offset = offset
+        self.anchor()
+
+    def anchor(self):
+        # Pin tick 0 to the next wall-clock boundary and measure every later tick from it on the monotonic clock
+        wall_time = time.time()
+        self.anchor_wall = math.ceil((wall_time - self.offset) / self.interval) * self.interval + self.offset
+        self.anchor_monotonic = time.monotonic() + (self.anchor_wall - wall_time)
+        self.tick = 0
+
+    def deadline(self, tick):
+        return self.anchor_monotonic + tick * self.interval
+
+    def wait(self):
+        # Sleep until the current tick, re-anchoring if the wall clock stepped away from the grid
+        remaining = self.deadline(self.tick) - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
+        drift = (time.time() - time.monotonic()) - (self.anchor_wall - self.anchor_monotonic)
+        if abs(drift) > CLOCK_STEP_TOLERANCE:
+            self.anchor()
+            self.wait()
+
+    def advance(self):
+        # Pick the next tick to run, returning how many were skipped
+        finished = time.monotonic()
+        latest_due = math.floor((finished - self.anchor_monotonic) / self.interval)
+        if latest_due <= self.tick:
+            self.tick += 1
+            return 0
+
+        if self.policy == 'skip':
+            skipped = latest_due - self.tick
+            self.tick = latest_due + 1
+        elif self.policy == 'late':
+            skipped = latest_due - self.tick - 1
+            self.tick = latest_due
+        else:
+            skipped = 0
+            self.tick += 1
+        return skipped
+
+    def record(self, cycle):
+        if self.log_path is None:
+            return
+        new_file = not os.path.exists(self.log_path)
+        with open(self.log_path, 'a', newline='') as f:
+            log = csv.DictWriter(f, fieldnames=CYCLE_LOG_COLUMNS)
+            if new_file:
+                log.writeheader()
+            log.writerow(cycle)
+
+    def run_cycle(self, function):
+        self.wait()
+        scheduled = datetime.fromtimestamp(self.anchor_wall + self.tick * self.interval)
+        started = datetime.now()
+        start_time = time.monotonic()
+        lateness = start_time - self.deadline(self.tick)
+
+        status = 'ok'
+        try:
+            function()
+        except Exception:
+            status = 'error'
+            raise
+        finally:
+            duration = time.monotonic() - start_time
+            overrun = time.monotonic() > self.deadline(self.tick + 1)
+            skipped = self.advance()
+            cycle = {
+                'scheduled': scheduled.isoformat(timespec='seconds'),
+                'started': started.isoformat(timespec='milliseconds'),
+                'lateness': round(lateness, 3),
+                'duration': round(duration, 3),
+                'overrun': overrun,
+                'skipped': skipped,
+                'status': status,
+            }
+            self.record(cycle)
+            metrics.observe('poll_cycle_seconds', duration)
+            metrics.increment('poll_cycles_total', status=status)
+            if overrun:
+                metrics.increment('poll_cycle_overruns_total')
+            metrics.increment('poll_skipped_ticks_total', skipped)
+            if overrun:
+                print(f"Cycle scheduled for {cycle['scheduled']} took {duration:.1f}s, skipped {skipped} tick(s) ({self.policy})")
+
+        return cycle
+
+    def run_forever(self, function):
+        while True:
+            try:
+                self.run_cycle(function)
+            except Exception as error:
+                # A failed cycle is logged and the next one runs on schedule
+                print(f"Poll cycle failed: {error!r}")
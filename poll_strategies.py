@@ -0,0 +1,165 @@
+from collections import namedtuple
+from datetime import datetime
+import psycopg2
+from predictions_config import db_config
+from db_writer import DatabaseWriter
+from schedules_schema import create_database_table, ensure_partitions
+from schedules_delta import DeltaWriter, create_delta_tables
+
+# One station's data for a poll cycle, fetched once and shared by every strategy. predictions holds
+# (trip ID, arrival time, departure time) tuples in the API's order, the schedule the next departures
+StationSnapshot = namedtuple('StationSnapshot', ['station', 'scheduled_trip_ids', 'scheduled_departure_times', 'predictions'])
+
+def create_response_data_table():
+    conn = psycopg2.connect(**db_config)
+    cursor = conn.cursor()
+
+    create_table_query = '''
+        CREATE TABLE IF NOT EXISTS response_data (
+            id SERIAL PRIMARY KEY,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            trip_id VARCHAR(255),
+            depart_station VARCHAR(255),
+            depart_time TIMESTAMP,
+            arrive_station VARCHAR(255),
+            arrive_time TIMESTAMP,
+            transit_time INTERVAL
+        )
+    '''
+
+    cursor.execute(create_table_query)
+    conn.commit()
+
+    cursor.close()
+    conn.close()
+
+def response_data_row(trip_id, departure_stop, departure_time, arrival_stop, arrival_time):
+    transit_time = None
+
+    if departure_time and arrival_time:
+        departure_time = datetime.fromisoformat(str(departure_time))
+        arrival_time = datetime.fromisoformat(arrival_time)
+        transit_time = arrival_time - departure_time
+
+    return (datetime.now(), trip_id, departure_stop, departure_time, arrival_stop, arrival_time, transit_time)
+
+def schedules_and_pred_row(trip_id, departure_stop, scheduled_depart_time, predicted_depart_time, arrival_stop, arrival_time):
+    transit_time = None
+
+    if arrival_time:
+        arrival_time = datetime.fromisoformat(arrival_time)
+        if predicted_depart_time:
+            predicted_depart_time = datetime.fromisoformat(str(predicted_depart_time))
+            transit_time = arrival_time - predicted_depart_time
+        elif scheduled_depart_time:
+            scheduled_depart_time = datetime.fromisoformat(str(scheduled_depart_time))
+            transit_time = arrival_time - scheduled_depart_time
+
+    return (datetime.now(), trip_id, departure_stop, scheduled_depart_time, predicted_depart_time, arrival_stop, arrival_time, transit_time)
+
+def select_trips(scheduled_trip_ids, scheduled_departure_times, predicted_trip_ids, predicted_departure_times):
+    trips = []
+
+    # Check if predicted trip IDs and departure times are None
+    if predicted_trip_ids is None or predicted_departure_times is None:
+        # Handle the case where no predicted trips are available
+        for i in range(len(scheduled_trip_ids)):
+            trips.append((scheduled_trip_ids[i], scheduled_departure_times[i], None))
+        return trips
+
+    # Compare up to three trip IDs
+    for i in range(3):
+        if i < len(scheduled_trip_ids) and i < len(predicted_trip_ids):
+            # If trip IDs match, assign predicted and scheduled times
+            if scheduled_trip_ids[i] == predicted_trip_ids[i]:
+                trip_id = scheduled_trip_ids[i]
+                scheduled_depart_time = scheduled_departure_times[i]
+                predicted_depart_time = predicted_departure_times[i]
+            else:
+                # If trip IDs don't match, insert each with the other field set as null
+                trip_id = scheduled_trip_ids[i]
+                scheduled_depart_time = scheduled_departure_times[i]
+                predicted_depart_time = None
+        else:
+            # If one of the lists is exhausted, insert remaining trip IDs with null fields
+            if i < len(scheduled_trip_ids):
+                trip_id = scheduled_trip_ids[i]
+                scheduled_depart_time = scheduled_departure_times[i]
+                predicted_depart_time = None
+            elif i < len(predicted_trip_ids):
+                trip_id = predicted_trip_ids[i]
+                scheduled_depart_time = None
+                predicted_depart_time = predicted_departure_times[i]
+            else:
+                break
+
+        trips.append((trip_id, scheduled_depart_time, predicted_depart_time))
+
+    return trips
+
+# predictions_3 logic: the next two predicted departures, topped up from the schedule, written to response_data
+# only when both the departure and arrival times are known
+class ResponseDataStrategy:
+    def __init__(self):
+        self.writer = DatabaseWriter('response_data', ['timestamp', 'trip_id', 'depart_station', 'depart_time', 'arrive_station', 'arrive_time', 'transit_time'])
+
+    def create_tables(self, delta=False):
+        # response_data has no delta mode, every row is written
+        create_response_data_table()
+
+    def select(self, snapshot):
+        # (trip ID, departure time) pairs, predictions first
+        trips = [(trip_id, departure_time) for trip_id, _, departure_time in snapshot.predictions[:2]]
+        for trip_id, departure_time in zip(snapshot.scheduled_trip_ids, snapshot.scheduled_departure_times):
+            if len(trips) >= 2:
+                break
+            if trip_id not in [selected_trip_id for selected_trip_id, _ in trips]:
+                trips.append((trip_id, departure_time))
+        return trips
+
+    def insert(self, station, trips, arrival_times):
+        for trip_id, departure_time in trips:
+            arrival_time = arrival_times.get(trip_id)
+            if departure_time and arrival_time:
+                self.writer.add(response_data_row(trip_id, station.name, departure_time, station.arrival_stop_name, arrival_time))
+
+    def flush(self):
+        self.writer.flush()
+
+# predictions_4 logic: the next three scheduled departures side by side with the predictions, written to
+# schedules_and_pred with None where either is missing
+class SchedulesAndPredStrategy:
+    def __init__(self):
+        self.writer = DatabaseWriter('schedules_and_pred', ['timestamp', 'trip_id', 'depart_station', 'scheduled_depart_time', 'predicted_depart_time', 'arrive_station', 'arrive_time', 'transit_time'])
+
+    def create_tables(self, delta=False):
+        create_database_table()
+
+        # In delta mode the rows go to the interval tables instead
+        if delta:
+            create_delta_tables()
+            self.writer = DeltaWriter()
+
+    def select(self, snapshot):
+        # (trip ID, scheduled departure, predicted departure) triples
+        predicted_trip_ids, predicted_departure_times = None, None
+        if snapshot.predictions:
+            predicted_trip_ids = [trip_id for trip_id, _, _ in snapshot.predictions]
+            predicted_departure_times = [datetime.fromisoformat(departure_time) for _, _, departure_time in snapshot.predictions]
+        return select_trips(snapshot.scheduled_trip_ids, snapshot.scheduled_departure_times, predicted_trip_ids, predicted_departure_times)
+
+    def insert(self, station, trips, arrival_times):
+        for trip_id, scheduled_depart_time, predicted_depart_time in trips:
+            self.writer.add(schedules_and_pred_row(trip_id, station.name, scheduled_depart_time, predicted_depart_time,
+                                                   station.arrival_stop_name, arrival_times.get(trip_id)))
+
+    def flush(self):
+        # Make sure the partition for this cycle's rows exists before writing them
+        ensure_partitions(datetime.now())
+        self.writer.flush()
+
+# Strategies the pollers can run, by the name given to --strategies
+STRATEGIES = {
+    'v3': ResponseDataStrategy,
+    'v4': SchedulesAndPredStrategy,
+}
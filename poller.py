@@ -0,0 +1,213 @@
+import asyncio
+import psycopg2
+from datetime import datetime, timezone, timedelta
+from predictions_config import API_KEY
+from schedule_cache import ScheduleCache
+from stations import STATIONS
+from adaptive_polling import AdaptivePollScheduler, sign_window
+from poll_scheduler import CYCLE_INTERVAL, TickScheduler
+from poller_metrics import metrics, start_metrics_server
+from mbta_client import API_BASE, MBTAClient, MBTAError
+from prediction_stream import PredictionStream
+from poll_strategies import StationSnapshot
+
+# API endpoints
+PREDICTIONS_ENDPOINT = f'{API_BASE}/predictions'
+SCHEDULES_ENDPOINT = f'{API_BASE}/schedules'
+
+# Limit on API calls in flight at once during a poll cycle
+MAX_CONCURRENT_REQUESTS = 8
+
+# Shared client so every API call reuses pooled connections and one rate limiter
+client = MBTAClient(API_BASE, MAX_CONCURRENT_REQUESTS)
+
+# Seconds between revalidations of a cached daily schedule
+SCHEDULE_REVALIDATE_INTERVAL = 15 * 60
+
+# Cached daily schedules for every departure stop
+schedule_cache = ScheduleCache(client, SCHEDULE_REVALIDATE_INTERVAL)
+
+# Scheduled departures read per station, enough for every strategy
+SCHEDULED_DEPARTURES = 3
+
+# Per-station prediction cadence, set from the next departure and how long predictions have held
+poll_scheduler = AdaptivePollScheduler()
+
+# Arrival times from earlier cycles, keyed by (arrival stop, trip ID), for stations not polled this cycle
+arrival_cache = {}
+
+# Live prediction streams when running with --stream, keyed by (stop, url params) for departure stops and by stop for arrival stops
+prediction_streams = {}
+
+def start_prediction_streams():
+    # Keep one stream open per departure stop and per arrival stop
+    for station in STATIONS:
+        if (station.stop_id, station.url_params) not in prediction_streams:
+            url = f"{PREDICTIONS_ENDPOINT}?filter[stop]={station.stop_id}{station.url_params}&api_key={API_KEY}"
+            prediction_streams[(station.stop_id, station.url_params)] = PredictionStream(client, url).start()
+        if station.arrival_stop_id not in prediction_streams:
+            url = f"{PREDICTIONS_ENDPOINT}?filter[stop]={station.arrival_stop_id}&api_key={API_KEY}"
+            prediction_streams[station.arrival_stop_id] = PredictionStream(client, url).start()
+
+def streamed_predictions(key):
+    # The stream's current (trip ID, arrival time, departure time) tuples, or None when not streaming or the stream is reconnecting
+    stream = prediction_streams.get(key)
+    return stream.snapshot() if stream else None
+
+def make_api_call(url):
+    # (trip ID, arrival time, departure time) for every record the call returns
+    return client.get_times(url)
+
+@metrics.timed('poller_call_seconds', function='get_scheduled_trips')
+def get_scheduled_trips(departure_stop_id, url_params):
+    # Answer from the cached schedule for the departure stop, revalidating it with the API when due
+    url = f"{SCHEDULES_ENDPOINT}?filter[stop]={departure_stop_id}{url_params}&api_key={API_KEY}"
+    current_time = datetime.now(timezone(timedelta(hours=-4)))
+    return schedule_cache.next_departures((departure_stop_id, url_params), url, current_time, SCHEDULED_DEPARTURES)
+
+@metrics.timed('poller_call_seconds', function='get_predictions')
+def get_predictions(stop_id, url_params):
+    # Read the departure stop's stream, or make one API call to predictions endpoint for it
+    times = streamed_predictions((stop_id, url_params))
+    if times is None:
+        url = f"{PREDICTIONS_ENDPOINT}?filter[stop]={stop_id}{url_params}&api_key={API_KEY}"
+        return make_api_call(url)
+
+    # Streamed predictions come in the order they changed, so put them back in departure order
+    times.sort(key=lambda record: record[2] or '')
+    return times
+
+@metrics.timed('poller_call_seconds', function='get_arrival_times')
+def get_arrival_times(trip_ids, stop_id):
+    arrival_times = {}
+    trip_ids = list(dict.fromkeys(trip_ids))
+
+    if not trip_ids:
+        return arrival_times
+
+    # Read the arrival stop's stream, or make one API call to predictions endpoint for the arrival stop and every trip ID
+    times = streamed_predictions(stop_id)
+    if times is None:
+        url = f"{PREDICTIONS_ENDPOINT}?filter[trip]={','.join(trip_ids)}&filter[stop]={stop_id}&api_key={API_KEY}"
+        times = make_api_call(url)
+
+    for trip_id, arrival_time, _ in times:
+        if trip_id in trip_ids and trip_id not in arrival_times:
+            arrival_times[trip_id] = arrival_time
+
+    # If no arrival time found, make one additional API call to schedules endpoint for the missing trips
+    missing_trip_ids = [trip_id for trip_id in trip_ids if trip_id not in arrival_times]
+    metrics.increment('arrival_lookups_total', len(trip_ids), stop=stop_id)
+    metrics.increment('arrival_fallbacks_total', len(missing_trip_ids), stop=stop_id)
+    if missing_trip_ids:
+        url = f"{SCHEDULES_ENDPOINT}?filter[trip]={','.join(missing_trip_ids)}&filter[stop]={stop_id}&api_key={API_KEY}"
+        for trip_id, arrival_time, _ in make_api_call(url):
+            if trip_id not in arrival_times:
+                arrival_times[trip_id] = arrival_time
+
+    for trip_id in missing_trip_ids:
+        arrival_times.setdefault(trip_id, None)
+
+    return arrival_times
+
+
+async def run_blocking(semaphore, function, *args):
+    # Run a blocking API call in a worker thread, limited by the shared semaphore
+    async with semaphore:
+        return await asyncio.to_thread(function, *args)
+
+
+async def poll_station(semaphore, station, current_time):
+    # The schedule comes from the cache, so it is read every cycle
+    scheduled_trip_ids, scheduled_departure_times = await run_blocking(semaphore, get_scheduled_trips, station.stop_id, station.url_params)
+
+    # Only ask for predictions when the station is due, otherwise reuse the last ones so every minute still gets rows.
+    # Stations are due every cycle while a departure is within sight of the signs, so reused predictions are only
+    # for departures no sign shows yet. A live stream is read every cycle since it costs no request
+    key = (station.stop_id, station.url_params)
+    stream = prediction_streams.get(key)
+    polled = (stream is not None and stream.ready.is_set()) or poll_scheduler.due(key, current_time)
+    metrics.increment('station_cycles_total', station=station.name, polled=polled)
+    if polled:
+        predictions = await run_blocking(semaphore, get_predictions, station.stop_id, station.url_params)
+        next_departures = scheduled_departure_times[:1] + [
+            datetime.fromisoformat(departure_time) for _, _, departure_time in predictions[:1] if departure_time]
+        poll_scheduler.record(key, current_time, predictions, min(next_departures, default=None), sign_window(scheduled_departure_times))
+    else:
+        predictions = poll_scheduler.cached_predictions(key, current_time)
+
+    return StationSnapshot(station, scheduled_trip_ids, scheduled_departure_times, predictions), polled
+
+
+async def poll_cycle(strategies):
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    current_time = datetime.now(timezone(timedelta(hours=-4)))
+
+    # Poll every station at once, reading its schedule and predictions once for every strategy.
+    # A station whose calls failed gets no rows this cycle, the others carry on
+    snapshots = []
+    for station, result in zip(STATIONS, await asyncio.gather(*[poll_station(semaphore, station, current_time) for station in STATIONS], return_exceptions=True)):
+        if isinstance(result, MBTAError):
+            print(f"Skipping {station.name} this cycle: {result}")
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            snapshots.append(result)
+
+    # Let every strategy pick its trips, then look up arrivals for trips of freshly polled stations and trips not
+    # seen before, with one batched lookup per arrival stop covering every strategy
+    selections = [[strategy.select(snapshot) for snapshot, _ in snapshots] for strategy in strategies]
+    trips_by_arrival_stop = {}
+    for strategy_selections in selections:
+        for (snapshot, polled), trips in zip(snapshots, strategy_selections):
+            arrival_stop_id = snapshot.station.arrival_stop_id
+            trips_by_arrival_stop.setdefault(arrival_stop_id, []).extend(
+                trip[0] for trip in trips if polled or (arrival_stop_id, trip[0]) not in arrival_cache)
+
+    arrival_maps = await asyncio.gather(*[
+        run_blocking(semaphore, get_arrival_times, trip_ids, arrival_stop_id)
+        for arrival_stop_id, trip_ids in trips_by_arrival_stop.items()
+    ], return_exceptions=True)
+    for arrival_stop_id, arrival_map in zip(trips_by_arrival_stop, arrival_maps):
+        if isinstance(arrival_map, MBTAError):
+            # Fall back to the arrivals already known, writing the rest without one
+            print(f"Failed to look up arrivals at {arrival_stop_id}: {arrival_map}")
+            continue
+        elif isinstance(arrival_map, BaseException):
+            raise arrival_map
+        for trip_id, arrival_time in arrival_map.items():
+            arrival_cache[(arrival_stop_id, trip_id)] = arrival_time
+
+    arrival_times = {}
+    for (arrival_stop_id, trip_id), arrival_time in arrival_cache.items():
+        arrival_times.setdefault(arrival_stop_id, {})[trip_id] = arrival_time
+
+    # Each strategy writes its own table from the shared snapshots, in station order. A table that fails to
+    # write does not stop the others from flushing, so every table keeps its cycles apart
+    used = set()
+    for strategy, strategy_selections in zip(strategies, selections):
+        for (snapshot, _), trips in zip(snapshots, strategy_selections):
+            arrival_stop_id = snapshot.station.arrival_stop_id
+            used.update((arrival_stop_id, trip[0]) for trip in trips)
+            strategy.insert(snapshot.station, trips, arrival_times.get(arrival_stop_id, {}))
+        try:
+            strategy.flush()
+        except psycopg2.Error as error:
+            metrics.increment('strategy_flush_errors_total', table=strategy.writer.table)
+            print(f"Failed to flush {strategy.writer.table} this cycle: {error}")
+
+    # Forget arrivals of trips no station shows any more
+    for key in [key for key in arrival_cache if key not in used]:
+        del arrival_cache[key]
+
+
+def grab_arrival_times(strategies, policy='skip', cycle_log=None, metrics_port=None, stream=False):
+    if metrics_port:
+        start_metrics_server(metrics_port)
+
+    if stream:
+        start_prediction_streams()
+
+    # Start a cycle at the top of every minute
+    scheduler = TickScheduler(CYCLE_INTERVAL, policy, cycle_log)
+    scheduler.run_forever(lambda: asyncio.run(poll_cycle(strategies)))
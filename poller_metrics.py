@@ -0,0 +1,138 @@
+import collections
+import contextlib
+import functools
+import sys
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+# Seconds between stack samples while the sampling profiler runs
+SAMPLE_INTERVAL = 0.005
+
+# Stacks reported by the sampling profiler
+PROFILE_TOP = 40
+
+def label_text(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}'
+
+# Counters and latency histograms for the pollers, rendered in the Prometheus text format
+class Metrics:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counters = collections.defaultdict(float)
+        self.histograms = {}
+
+    def increment(self, name, amount=1, **labels):
+        with self.lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += amount
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'counts': [0] * len(self.buckets), 'count': 0, 'sum': 0.0}
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram['counts'][i] += 1
+            histogram['count'] += 1
+            histogram['sum'] += seconds
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start_time, **labels)
+
+    def timed(self, name, **labels):
+        # Decorator recording every call's latency under the given histogram name
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f"{name}{label_text(labels)} {value:g}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                for bound, count in zip(self.buckets, histogram['counts']):
+                    lines.append(f"{name}_bucket{label_text(labels + (('le', bound),))} {count}")
+                lines.append(f"{name}_bucket{label_text(labels + (('le', '+Inf'),))} {histogram['count']}")
+                lines.append(f"{name}_sum{label_text(labels)} {histogram['sum']:.6f}")
+                lines.append(f"{name}_count{label_text(labels)} {histogram['count']}")
+        return '\n'.join(lines) + '\n'
+
+# Shared registry the poller modules record into
+metrics = Metrics()
+
+def record_api_call(url, response, seconds):
+    # Count an MBTA API request by endpoint and status, with its latency and body size as sent, compressed or not
+    endpoint = urlparse(url).path.rstrip('/').rsplit('/', 1)[-1]
+    metrics.increment('api_requests_total', endpoint=endpoint, status=response.status_code)
+    metrics.increment('api_response_bytes_total', int(response.headers.get('Content-Length', len(response.content))), endpoint=endpoint)
+    metrics.observe('api_request_seconds', seconds, endpoint=endpoint)
+
+def sample_stacks(seconds, interval=SAMPLE_INTERVAL, top=PROFILE_TOP):
+    # Sample every thread's stack for a while and report the most frequent ones, innermost call last
+    own_thread = threading.get_ident()
+    stacks = collections.Counter()
+    samples = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread:
+                continue
+            stack = traceback.extract_stack(frame)
+            stacks[';'.join(f"{entry.name} ({entry.filename.rsplit('/', 1)[-1]}:{entry.lineno})" for entry in stack)] += 1
+        samples += 1
+        time.sleep(interval)
+
+    lines = [f"{samples} samples over {seconds}s"]
+    for stack, count in stacks.most_common(top):
+        lines.append(f"{count:6d} {stack}")
+    return '\n'.join(lines) + '\n'
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/metrics':
+            body = metrics.render()
+        elif url.path == '/profile':
+            # Profile the running poller on demand, e.g. /profile?seconds=30
+            params = parse_qs(url.query)
+            body = sample_stacks(float(params.get('seconds', ['10'])[0]))
+        else:
+            self.send_error(404)
+            return
+
+        body = body.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port, host='127.0.0.1'):
+    # Serve /metrics and /profile from a background thread
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,94 @@
+import threading
+import time
+
+import requests
+
+from mbta_client import MBTAError, loads, record_times, sparse_url
+from poller_metrics import metrics
+
+# Read timeout on an open stream; the API sends keep-alive comments well within it
+STREAM_READ_TIMEOUT = 90
+
+# Parse a text/event-stream body into (event, data) pairs
+def parse_events(lines):
+    event, data = None, []
+    for line in lines:
+        if line is None:
+            continue
+        if line == '':
+            if event is not None or data:
+                yield event or 'message', '\n'.join(data)
+            event, data = None, []
+        elif line.startswith(':'):
+            continue
+        elif line.startswith('event:'):
+            event = line[6:].strip()
+        elif line.startswith('data:'):
+            data.append(line[5:].lstrip())
+
+# Keeps the live set of predictions for one query up to date from the API's event stream
+class PredictionStream:
+    def __init__(self, client, url):
+        self.client = client
+        self.url = sparse_url(url)
+        self.lock = threading.Lock()
+        self.records = {}
+        self.ready = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def apply(self, event, data):
+        # reset replaces everything, add and update carry one record, remove carries its id.
+        # Only each record's record_times tuple is kept
+        payload = loads(data)
+        with self.lock:
+            if event == 'reset':
+                self.records = {record['id']: record_times(record) for record in payload}
+                self.ready.set()
+            elif event in ('add', 'update'):
+                self.records[payload['id']] = record_times(payload)
+            elif event == 'remove':
+                self.records.pop(payload['id'], None)
+        metrics.increment('stream_events_total', event=event)
+
+    def run(self):
+        attempt = 0
+        while not self.stopped.is_set():
+            try:
+                self.client.limiter.acquire()
+                with self.client.session.get(self.url, headers={'Accept': 'text/event-stream'}, stream=True,
+                                             timeout=(self.client.timeout[0], STREAM_READ_TIMEOUT)) as response:
+                    if response.status_code != 200:
+                        raise MBTAError(f"Failed to open prediction stream. Status code: {response.status_code}")
+                    metrics.increment('stream_connections_total')
+                    attempt = 0
+
+                    # Read events as each chunk arrives rather than waiting for a full buffer
+                    response.encoding = 'utf-8'
+                    for event, data in parse_events(response.iter_lines(chunk_size=None, decode_unicode=True)):
+                        self.apply(event, data)
+                        if self.stopped.is_set():
+                            return
+            except (requests.RequestException, MBTAError, ValueError) as error:
+                print(f"Prediction stream {self.url} dropped, reconnecting: {error}")
+
+            # Until the next reset arrives the state may be stale, so fall back to polling meanwhile
+            self.ready.clear()
+            metrics.increment('stream_reconnects_total')
+            time.sleep(self.client.backoff(attempt))
+            attempt += 1
+
+    def snapshot(self):
+        # The current predictions as record_times tuples, or None while the stream is not live
+        if not self.ready.is_set():
+            return None
+        with self.lock:
+            return list(self.records.values())
@@ -0,0 +1,27 @@
+import argparse
+from poll_scheduler import OVERRUN_POLICIES
+from poll_strategies import STRATEGIES
+from poller import grab_arrival_times
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Poll MBTA schedules and predictions once per cycle for several selection strategies.')
+    parser.add_argument('--strategies', default='v3,v4', help=f"comma-separated strategies to run, from {', '.join(STRATEGIES)}")
+    parser.add_argument('--overrun', choices=OVERRUN_POLICIES, default='skip', help='what to do when a cycle runs past the next minute')
+    parser.add_argument('--cycle-log', help='CSV file recording the timing of every cycle')
+    parser.add_argument('--metrics-port', type=int, help='serve /metrics and /profile on this local port')
+    parser.add_argument('--delta', action='store_true', help='store schedules_and_pred as validity intervals instead of every snapshot')
+    parser.add_argument('--stream', action='store_true', help='keep predictions current from the API event stream instead of polling them')
+    args = parser.parse_args()
+
+    names = args.strategies.split(',')
+    for name in names:
+        if name not in STRATEGIES:
+            parser.error(f"unknown strategy {name}, choose from {', '.join(STRATEGIES)}")
+    strategies = [STRATEGIES[name]() for name in names]
+
+    # Generate database schema for every strategy's table
+    for strategy in strategies:
+        strategy.create_tables(args.delta)
+
+    # Start process
+    grab_arrival_times(strategies, args.overrun, args.cycle_log, args.metrics_port, args.stream)
@@ -0,0 +1,74 @@
+import bisect
+import threading
+import time
+from datetime import datetime, timedelta
+from mbta_client import MBTAError, loads, record_times, sparse_url
+
+# MBTA service days roll over at 3 AM local time
+SERVICE_DAY_START_HOUR = 3
+
+# Default number of seconds before a cached schedule is revalidated with the API
+REVALIDATE_INTERVAL = 15 * 60
+
+def service_day(current_time):
+    return (current_time - timedelta(hours=SERVICE_DAY_START_HOUR)).date()
+
+# Keeps each (stop, filter) schedule pre-parsed and sorted for the current service day
+class ScheduleCache:
+    def __init__(self, client, revalidate_interval=REVALIDATE_INTERVAL):
+        self.client = client
+        self.revalidate_interval = revalidate_interval
+        self.entries = {}
+        # Stations read the cache from worker threads, so eviction and swapping in entries are serialized
+        self.lock = threading.Lock()
+
+    def fetch(self, url, entry):
+        # Send the validators from the cached response so unchanged schedules come back as 304
+        headers = {}
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        response = self.client.get(sparse_url(url), headers=headers)
+        if response.status_code == 304 and entry is not None:
+            entry['validated_at'] = time.monotonic()
+            return entry
+        if response.status_code != 200:
+            raise MBTAError(f"Failed to make API call. Status code: {response.status_code}")
+
+        # Parse and sort the departures once per download
+        departures = [
+            (datetime.fromisoformat(departure_time), trip_id)
+            for trip_id, _, departure_time in map(record_times, loads(response.content)['data'])
+        ]
+        departures.sort(key=lambda x: x[0])
+
+        return {
+            'departure_times': [departure_time for departure_time, _ in departures],
+            'trip_ids': [trip_id for _, trip_id in departures],
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'validated_at': time.monotonic(),
+        }
+
+    def next_departures(self, key, url, current_time, count):
+        today = service_day(current_time)
+
+        # Evict schedules left over from a previous service day
+        with self.lock:
+            for stale_key in [cached_key for cached_key, entry in self.entries.items() if entry['service_day'] != today]:
+                del self.entries[stale_key]
+            entry = self.entries.get(key)
+
+        # Fetch outside the lock so one station's download does not hold up the others
+        if entry is None or time.monotonic() - entry['validated_at'] >= self.revalidate_interval:
+            entry = self.fetch(url, entry)
+            entry['service_day'] = today
+            with self.lock:
+                self.entries[key] = entry
+
+        # Find the first departure that has not already passed
+        start = bisect.bisect_left(entry['departure_times'], current_time)
+        return entry['trip_ids'][start:start + count], entry['departure_times'][start:start + count]
@@ -0,0 +1,140 @@
+import psycopg2
+from datetime import datetime
+from psycopg2.extras import execute_values
+from predictions_config import db_config
+from db_writer import MAX_HELD_ROWS, DatabaseWriter
+
+# Columns of a schedules_and_pred row after its timestamp
+VALUE_COLUMNS = ['trip_id', 'depart_station', 'scheduled_depart_time', 'predicted_depart_time', 'arrive_station', 'arrive_time', 'transit_time']
+
+def create_delta_tables():
+    conn = psycopg2.connect(**db_config)
+    cursor = conn.cursor()
+
+    # One row per version of a trip's departure and arrival, valid from the cycle that first saw it until the cycle that changed it
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schedules_and_pred_intervals (
+            id SERIAL PRIMARY KEY,
+            valid_from TIMESTAMP NOT NULL,
+            valid_to TIMESTAMP,
+            trip_id VARCHAR(255),
+            depart_station VARCHAR(255),
+            scheduled_depart_time TIMESTAMP,
+            predicted_depart_time TIMESTAMP,
+            arrive_station VARCHAR(255),
+            arrive_time TIMESTAMP,
+            transit_time INTERVAL
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS schedules_and_pred_intervals_valid_idx
+        ON schedules_and_pred_intervals (valid_from, valid_to)
+    ''')
+
+    # Every poll cycle that ran, so minutes without a cycle stay empty instead of inheriting open intervals
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schedules_and_pred_cycles (
+            cycle_time TIMESTAMP PRIMARY KEY
+        )
+    ''')
+
+    # The rows snapshot mode would have written, rebuilt from the intervals. Only created once, since
+    # replacing it waits for every open reader of the tables to finish
+    cursor.execute("SELECT 1 FROM pg_views WHERE viewname = 'schedules_and_pred_asof'")
+    if cursor.fetchone() is None:
+        cursor.execute('''
+            CREATE VIEW schedules_and_pred_asof AS
+            SELECT c.cycle_time AS timestamp, date_trunc('minute', c.cycle_time) AS minute_bucket,
+                   i.trip_id, i.depart_station, i.scheduled_depart_time, i.predicted_depart_time,
+                   i.arrive_station, i.arrive_time, i.transit_time
+            FROM schedules_and_pred_cycles c
+            JOIN schedules_and_pred_intervals i
+            ON i.valid_from <= c.cycle_time AND (i.valid_to IS NULL OR i.valid_to > c.cycle_time)
+        ''')
+
+    # Intervals left open by a previous run were last confirmed by its final cycle
+    cursor.execute('''
+        UPDATE schedules_and_pred_intervals
+        SET valid_to = (SELECT max(cycle_time) FROM schedules_and_pred_cycles) + interval '1 microsecond'
+        WHERE valid_to IS NULL
+    ''')
+
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+def snapshot_keys(rows):
+    # Key rows by station and trip, numbering repeats so a trip listed twice keeps both rows
+    seen = {}
+    keyed = {}
+    for row in rows:
+        key = (row[2], row[1])
+        occurrence = seen.get(key, 0)
+        seen[key] = occurrence + 1
+        keyed[key + (occurrence,)] = row[1:]
+    return keyed
+
+# Writes only the rows that changed since the previous cycle, as validity intervals
+class DeltaWriter(DatabaseWriter):
+    def __init__(self, max_attempts=3, retry_delay=1, max_held_rows=MAX_HELD_ROWS):
+        super().__init__('schedules_and_pred_intervals', ['valid_from'] + VALUE_COLUMNS, max_attempts, retry_delay, max_held_rows)
+        self.open = {}
+        self.cycles = []
+        self.pending_open = None
+
+    def flush(self):
+        # Seal this cycle's rows so a failed write keeps cycles apart when it is retried
+        if self.rows or self.open or self.cycles:
+            cycle_time = min((row[0] for row in self.rows), default=datetime.now())
+            self.cycles.append((cycle_time, self.rows))
+            self.rows = []
+        return super().flush()
+
+    def pending(self):
+        return bool(self.cycles)
+
+    def held(self):
+        return [row for _, rows in self.cycles for row in rows]
+
+    def drop(self, count=None):
+        # Forget whole cycles, oldest first, until count rows are gone, or every held cycle.
+        # The open intervals are untouched, so the next cycle written closes whatever changed
+        if count is None:
+            self.cycles = []
+        while self.cycles and count is not None and count > 0:
+            count -= len(self.cycles.pop(0)[1])
+
+    def discard(self, rows):
+        # Forget the given rows from whichever cycles hold them, keeping the cycles themselves
+        discarded = {id(row) for row in rows}
+        self.cycles = [(cycle_time, [row for row in cycle_rows if id(row) not in discarded]) for cycle_time, cycle_rows in self.cycles]
+
+    def write(self, cursor):
+        open_intervals = dict(self.open)
+        stored = 0
+        for cycle_time, rows in self.cycles:
+            current = snapshot_keys(rows)
+            cursor.execute('INSERT INTO schedules_and_pred_cycles (cycle_time) VALUES (%s) ON CONFLICT DO NOTHING', (cycle_time,))
+
+            # Close intervals whose trip changed or disappeared
+            closed = {key: interval_id for key, (interval_id, values) in open_intervals.items() if current.get(key) != values}
+            if closed:
+                cursor.execute('UPDATE schedules_and_pred_intervals SET valid_to = %s WHERE id = ANY(%s)', (cycle_time, list(closed.values())))
+            open_intervals = {key: interval for key, interval in open_intervals.items() if key not in closed}
+
+            # Open intervals for new trips and new values
+            changed = [(key, values) for key, values in current.items() if key not in open_intervals]
+            if changed:
+                ids = execute_values(cursor, f"""
+                    INSERT INTO schedules_and_pred_intervals ({', '.join(self.columns)}) VALUES %s RETURNING id
+                """, [(cycle_time,) + values for _, values in changed], page_size=len(changed), fetch=True)
+                for (key, values), (interval_id,) in zip(changed, ids):
+                    open_intervals[key] = (interval_id, values)
+            stored += len(changed)
+
+        self.pending_open = open_intervals
+        return stored
+
+    def written(self):
+        self.open = self.pending_open
+        self.cycles = []
@@ -0,0 +1,123 @@
+import psycopg2
+from datetime import datetime
+from predictions_config import db_config
+
+# Size of each schedules_and_pred partition, 'month' or 'day'
+PARTITION_INTERVAL = 'month'
+
+# Partitions already known to exist, so the poller only creates each one once
+known_partitions = set()
+
+def partition_bounds(moment, interval=PARTITION_INTERVAL):
+    # Return the start and end of the partition holding the given moment
+    if interval == 'day':
+        start = datetime(moment.year, moment.month, moment.day)
+        end = datetime.fromordinal(start.toordinal() + 1)
+        return start, end, f"schedules_and_pred_{start:%Y_%m_%d}"
+
+    start = datetime(moment.year, moment.month, 1)
+    end = datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start, end, f"schedules_and_pred_{start:%Y_%m}"
+
+def create_partitions(cursor, first, last, interval=PARTITION_INTERVAL):
+    # Create every partition from the one holding first through the one holding last
+    start, end, name = partition_bounds(first, interval)
+    while start <= last:
+        if name not in known_partitions:
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {name} PARTITION OF schedules_and_pred
+                FOR VALUES FROM (%s) TO (%s)
+            ''', (start, end))
+            known_partitions.add(name)
+        start, end, name = partition_bounds(end, interval)
+
+def create_partitioned_table(cursor):
+    create_table_query = '''
+        CREATE TABLE IF NOT EXISTS schedules_and_pred (
+            id SERIAL,
+            timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            minute_bucket TIMESTAMP GENERATED ALWAYS AS (date_trunc('minute', timestamp)) STORED,
+            trip_id VARCHAR(255),
+            depart_station VARCHAR(255),
+            scheduled_depart_time TIMESTAMP,
+            predicted_depart_time TIMESTAMP,
+            arrive_station VARCHAR(255),
+            arrive_time TIMESTAMP,
+            transit_time INTERVAL,
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    '''
+    cursor.execute(create_table_query)
+
+    # Catch rows outside the created partitions rather than failing the insert
+    cursor.execute('CREATE TABLE IF NOT EXISTS schedules_and_pred_default PARTITION OF schedules_and_pred DEFAULT')
+
+    # Composite indexes serving the comparison's (minute, station, departure time) lookups
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS schedules_and_pred_scheduled_idx
+        ON schedules_and_pred (minute_bucket, depart_station, scheduled_depart_time)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS schedules_and_pred_predicted_idx
+        ON schedules_and_pred (minute_bucket, depart_station, predicted_depart_time)
+    ''')
+
+def migrate_legacy_table(cursor):
+    # Move the rows of an unpartitioned schedules_and_pred into the partitioned layout
+    cursor.execute('ALTER TABLE schedules_and_pred RENAME TO schedules_and_pred_legacy')
+    cursor.execute('ALTER TABLE schedules_and_pred_legacy RENAME CONSTRAINT schedules_and_pred_pkey TO schedules_and_pred_legacy_pkey')
+    cursor.execute('ALTER SEQUENCE schedules_and_pred_id_seq RENAME TO schedules_and_pred_legacy_id_seq')
+    create_partitioned_table(cursor)
+
+    cursor.execute('SELECT min(timestamp), max(timestamp) FROM schedules_and_pred_legacy')
+    first, last = cursor.fetchone()
+    if first is not None:
+        create_partitions(cursor, first, last)
+
+    cursor.execute('''
+        INSERT INTO schedules_and_pred (id, timestamp, trip_id, depart_station, scheduled_depart_time, predicted_depart_time, arrive_station, arrive_time, transit_time)
+        SELECT id, COALESCE(timestamp, '-infinity'), trip_id, depart_station, scheduled_depart_time, predicted_depart_time, arrive_station, arrive_time, transit_time
+        FROM schedules_and_pred_legacy
+    ''')
+    cursor.execute("SELECT setval('schedules_and_pred_id_seq', COALESCE((SELECT max(id) FROM schedules_and_pred), 0) + 1, false)")
+    cursor.execute('DROP TABLE schedules_and_pred_legacy')
+
+def create_database_table():
+    conn = psycopg2.connect(**db_config)
+    cursor = conn.cursor()
+
+    # Check whether the table exists yet, and if so whether it is already partitioned
+    cursor.execute("SELECT relkind FROM pg_class WHERE relname = 'schedules_and_pred' AND relkind IN ('r', 'p')")
+    table = cursor.fetchone()
+
+    if table is None:
+        create_partitioned_table(cursor)
+    elif table[0] == 'r':
+        migrate_legacy_table(cursor)
+    else:
+        create_partitioned_table(cursor)
+
+    # Always have the current and next partitions ready
+    now = datetime.now()
+    create_partitions(cursor, now, partition_bounds(now)[1])
+
+    # Schema changes and the data migration commit together
+    conn.commit()
+
+    cursor.close()
+    conn.close()
+
+def ensure_partitions(moment):
+    # Create the partition for the given moment and the one after it if not done yet this run
+    start, end, name = partition_bounds(moment)
+    _, _, next_name = partition_bounds(end)
+    if name in known_partitions and next_name in known_partitions:
+        return
+
+    conn = psycopg2.connect(**db_config)
+    cursor = conn.cursor()
+    create_partitions(cursor, moment, end)
+    conn.commit()
+
+    cursor.close()
+    conn.close()
@@ -0,0 +1,18 @@
+from collections import namedtuple
+
+# A departure stop the pollers watch and the arrival stop its transit times are measured to
+Station = namedtuple('Station', ['stop_id', 'name', 'url_params', 'arrival_stop_id', 'arrival_stop_name'])
+
+# CR Params
+CR_url_params = '&filter[direction_id]=1'
+
+# BL Params
+BL_url_params = '&filter[direction_id]=0&filter[route]=Blue'
+
+# Every station polled, in the order their rows are written
+STATIONS = [
+    Station('place-ER-0362', 'Newburyport', CR_url_params, 'BNT-0000', 'North Station'),
+    Station('place-ER-0183', 'Beverly', CR_url_params, 'BNT-0000', 'North Station'),
+    Station('place-wondl', 'Wonderland', BL_url_params, 'place-state', 'State'),
+    Station('place-bmmnl', 'Beachmont', BL_url_params, 'place-state', 'State'),
+]
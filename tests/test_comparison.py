@@ -0,0 +1,165 @@
+import importlib.util
+import os
+import re
+import sys
+import types
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_comp_logic():
+    # comp_logic connects to the database on import, but the comparison itself only reads its index
+    config = types.ModuleType('predictions_config')
+    config.db_config = {}
+    with mock.patch.dict(sys.modules, {'predictions_config': config}), mock.patch('psycopg2.connect'):
+        spec = importlib.util.spec_from_file_location('comp_logic', os.path.join(REPO_DIR, 'comp_logic_2.0.py'))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    return module
+
+comp_logic = load_comp_logic()
+
+# schedules_and_pred rows as (timestamp, depart_station, scheduled_depart_time, predicted_depart_time)
+SCHEDULES_AND_PRED = [
+    # Four scheduled records after the buffer, one listed twice, so the two closest are taken after deduplicating
+    (datetime(2023, 8, 1, 8, 0, 5), 'Newburyport', datetime(2023, 8, 1, 8, 5), datetime(2023, 8, 1, 8, 6)),
+    (datetime(2023, 8, 1, 8, 0, 5), 'Newburyport', datetime(2023, 8, 1, 8, 20), datetime(2023, 8, 1, 8, 22)),
+    (datetime(2023, 8, 1, 8, 0, 5), 'Newburyport', datetime(2023, 8, 1, 8, 50), None),
+    (datetime(2023, 8, 1, 8, 0, 5), 'Newburyport', datetime(2023, 8, 1, 8, 50), None),
+    (datetime(2023, 8, 1, 8, 0, 5), 'Newburyport', datetime(2023, 8, 1, 9, 20), None),
+    # Two records for the same departure, kept as they are since there are fewer than three
+    (datetime(2023, 8, 1, 8, 0, 5), 'Beverly', datetime(2023, 8, 1, 8, 30), datetime(2023, 8, 1, 8, 31)),
+    (datetime(2023, 8, 1, 8, 0, 5), 'Beverly', datetime(2023, 8, 1, 8, 30), None),
+    # Afternoon departures, to cover the 12-hour clock
+    (datetime(2023, 8, 1, 12, 0, 5), 'Beverly', datetime(2023, 8, 1, 12, 15), datetime(2023, 8, 1, 12, 16)),
+    (datetime(2023, 8, 1, 12, 0, 5), 'Beverly', datetime(2023, 8, 1, 12, 45), None),
+    (datetime(2023, 8, 1, 12, 0, 5), 'Beverly', datetime(2023, 8, 1, 13, 15), None),
+]
+
+# VMS log rows as (timestamp, sign ID, location, logic state, message, parking TT, highway/transit ratio)
+VMS_LOG = [
+    ('2023-08-01 08:00:30', 'VMS-01', 'Newburyport', 'Normal', 'TRAIN @ 08:22 AM[nl]NEXT @ 08:50 AM', 10, 1.0),
+    ('2023-08-01 08:00:40', 'VMS-01', 'Newburyport', 'Normal', 'TRAIN @ 08:20 AM[nl]NEXT @ 08:50 AM', 10, 1.0),
+    ('2023-08-01 08:00:50', 'VMS-01', 'Newburyport', 'Normal', 'TRAIN @ 08:22 AM[np]NEXT @ 09:45 AM', 10, 1.5),
+    ('2023-08-01 08:00:55', 'VMS-01', 'Newburyport', 'Normal', 'TRAIN @ 07:00 AM[nl]NEXT @ 07:30 AM', 10, 1.0),
+    ('2023-08-01 08:00:59', 'VMS-01', 'Newburyport', 'Normal', 'TRAIN @ 08:50 AM[nl]NEXT @ 08:50 AM', 10, 1.0),
+    ('2023-08-01 08:00:10', 'VMS-02', 'Beverly', 'Normal', 'FASTER ROUTE @ 08:30 AM[nl]NEXT @ 08:30 AM', 10, 1.3),
+    ('2023-08-01 08:00:20', 'VMS-02', 'Beverly', 'Normal', 'TRAIN @ 08:30 AM', None, 1.0),
+    ('2023-08-01 08:01:10', 'VMS-02', 'Beverly', 'Normal', 'TRAIN @ 08:30 AM', 10, 1.0),
+    ('2023-08-01 12:00:15', 'VMS-02', 'Beverly', 'Normal', 'FASTER ROUTE @ 12:16 PM[nl]NEXT @ 12:45 PM', 10, 1.1),
+    ('2023-08-01 12:00:25', 'VMS-02', 'Beverly', 'Normal', 'TRAIN @ 12:15 PM[nl]NEXT @ 01:15 PM', 10, 1.0),
+    ('2023-08-01 08:00:30', 'VMS-03', 'Wonderland', 'Normal', 'TRAIN @ 07:00 AM', 10, 1.0),
+    ('2023-08-01 08:00:30', 'VMS-01', 'Newburyport', 'Off', 'TRAIN @ 07:00 AM', 10, 1.0),
+]
+
+def read_log():
+    # The raw rows as read_csv returns them, with the empty column the trailing separator leaves
+    return pd.DataFrame([
+        (timestamp, sign_id, location, logic_state, message, None, parking_tt, 30, None, None, 40, ratio, None)
+        for timestamp, sign_id, location, logic_state, message, parking_tt, ratio in VMS_LOG
+    ])
+
+# The per-row comparison process_data ran before it was vectorized, querying the fixture instead of the database
+def reference_process_data(df):
+    filtered_df = df[(df['Location'].isin(['Newburyport', 'Beverly'])) & (df['Logic State'] == 'Normal')]
+    inconsistencies = []
+    message_errors = []
+
+    def query(timestamp, location, column, buffer_time):
+        records = [(station, record[column]) for record in SCHEDULES_AND_PRED
+                   for station in [record[1]]
+                   if record[0].replace(second=0) == timestamp.replace(second=0) and station == location
+                   and record[column] is not None and record[column] >= buffer_time]
+        return sorted(records, key=lambda x: x[1])
+
+    for _, row in filtered_df.iterrows():
+        timestamp = row['Timestamp']
+        message = ' '.join(re.split(r'\[nl\]|\[np\]', row['Message']))
+        parking_TT = row['Transit Parking TT']
+        ratio = row['Highway/Transit Ratio']
+        reported_times = [datetime.strptime(time, '%I:%M %p').strftime('%H:%M') for time in re.findall(r'@ (\d{2}:\d{2} [APM]{2})', message)]
+
+        if pd.isnull(timestamp) or pd.isnull(row['Location']) or pd.isnull(message) or pd.isnull(parking_TT):
+            inconsistencies.append((timestamp, row['Sign ID'], None, row['Location'], reported_times, None, None, 'Missing Field'))
+            continue
+
+        buffered_timestamp = pd.to_datetime(timestamp) + pd.Timedelta(minutes=parking_TT)
+        if (ratio >= 1.2 and 'FASTER ROUTE' not in message) or ('FASTER ROUTE' in message and ratio < 1.2):
+            message_errors.append((timestamp, row['Sign ID'], buffered_timestamp, row['Location'], message, ratio))
+
+        queried_records = query(timestamp, row['Location'], 2, buffered_timestamp)
+        if len(queried_records) >= 3:
+            queried_records = list(set(queried_records))
+            queried_records.sort(key=lambda x: x[1])
+            queried_records = queried_records[:2]
+        scheduled_times = [record[1].strftime('%H:%M') for record in queried_records]
+        predicted_times = [record[1].strftime('%H:%M') for record in query(timestamp, row['Location'], 3, buffered_timestamp)]
+
+        if scheduled_times:
+            unmatched_reported_times = reported_times.copy()
+            matched_predicted_times = set()
+            for predicted_time in predicted_times:
+                if predicted_time in unmatched_reported_times:
+                    unmatched_reported_times.remove(predicted_time)
+                    matched_predicted_times.add(predicted_time)
+            matched_scheduled_times = set()
+            for scheduled_time in scheduled_times:
+                if scheduled_time in unmatched_reported_times:
+                    unmatched_reported_times.remove(scheduled_time)
+                    matched_scheduled_times.add(scheduled_time)
+
+            if any(predicted_times) and not matched_predicted_times and matched_scheduled_times and not unmatched_reported_times:
+                mismatch_type = 'Predictions'
+            elif not matched_predicted_times and not matched_scheduled_times:
+                mismatch_type = 'Complete'
+            elif unmatched_reported_times:
+                mismatch_type = 'Partial'
+            else:
+                continue
+            inconsistencies.append((timestamp, row['Sign ID'], buffered_timestamp, row['Location'], reported_times, scheduled_times, predicted_times, mismatch_type))
+        else:
+            inconsistencies.append((timestamp, row['Sign ID'], buffered_timestamp, row['Location'], reported_times, None, None, 'No Data'))
+
+    return inconsistencies, message_errors
+
+# A schedule index answered from the fixture instead of the database
+class FixtureScheduleIndex(comp_logic.ScheduleIndex):
+    def read_records(self, day):
+        return pd.DataFrame([
+            (timestamp.replace(second=0), location, scheduled, predicted)
+            for timestamp, location, scheduled, predicted in SCHEDULES_AND_PRED if timestamp.date() == day
+        ], columns=['Minute', 'Location', 'Scheduled', 'Predicted'])
+
+def result_rows(frame):
+    return [tuple(None if not isinstance(value, list) and pd.isnull(value) else value for value in row)
+            for row in frame.itertuples(index=False)]
+
+class ComparisonTest(unittest.TestCase):
+    def test_matches_per_row_comparison(self):
+        df = comp_logic.parse_log_chunk(read_log())
+        inconsistencies, message_errors = comp_logic.process_data(df, FixtureScheduleIndex())
+
+        reference = read_log().iloc[:, :-1]
+        reference.columns = comp_logic.LOG_COLUMNS
+        reference['Timestamp'] = pd.to_datetime(reference['Timestamp'])
+        expected_inconsistencies, expected_message_errors = reference_process_data(reference)
+
+        self.assertEqual(result_rows(inconsistencies), expected_inconsistencies)
+        self.assertEqual(result_rows(message_errors), expected_message_errors)
+
+    def test_fixture_covers_every_case(self):
+        df = comp_logic.parse_log_chunk(read_log())
+        inconsistencies, _ = comp_logic.process_data(df, FixtureScheduleIndex())
+        self.assertEqual(list(inconsistencies['Mismatch Type']),
+                         ['Predictions', 'Partial', 'Complete', 'Partial', 'Predictions', 'Missing Field', 'No Data', 'Partial'])
+
+        # Deduplicated when three or more scheduled records remain, kept as they are otherwise
+        self.assertEqual(inconsistencies['Scheduled Times'][0], ['08:20', '08:50'])
+        self.assertEqual(inconsistencies['Scheduled Times'][4], ['08:30', '08:30'])
+
+if __name__ == '__main__':
+    unittest.main()